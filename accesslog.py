@@ -0,0 +1,129 @@
+"""Логирование без задержки запросов: очередь + фоновый писатель, и
+структурированный access-лог на уровне WSGI.
+
+Обработчики кладут записи в ограниченную очередь (при переполнении
+запись отбрасывается, а не ждёт), пишет их отдельный поток. Access-лог -
+одна JSON-строка на запрос: метод, маршрут, статус, байты, задержка,
+воркер. Частые служебные маршруты (ping, health) можно сэмплировать;
+ошибки 5xx и медленные запросы пишутся всегда.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+
+ROUTE_KEY = 'accesslog.route'  # маршрут Flask кладёт сюда в before_request
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при полной очереди теряет запись, а не блокирует"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(level=logging.INFO, max_queue=10000):
+    """Корневой логгер пишет через очередь; возвращает запущенный QueueListener"""
+    log_queue = queue.Queue(max_queue)
+    writer = logging.StreamHandler()
+    writer.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)  # дописать очередь при выходе
+    return listener
+
+
+def parse_sample_rates(spec):
+    """'/api/ping=0.01,/api/health=0.1' -> {'/api/ping': 0.01, '/api/health': 0.1}"""
+    rates = {}
+    for item in spec.split(','):
+        if '=' in item:
+            route, rate = item.split('=', 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+class AccessLogMiddleware:
+    def __init__(self, app, logger, sample_rates=None, slow_ms=1000, observer=None):
+        self.app = app
+        self.logger = logger
+        self.sample_rates = sample_rates or {}
+        self.slow_ms = slow_ms
+        self.observer = observer  # observer(route, method, status, секунды, байты) - до сэмплирования
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        status = []
+
+        def capture(status_line, headers, exc_info=None):
+            status[:] = [int(status_line.split(' ', 1)[0])]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            app_iter = self.app(environ, capture)
+        except Exception:
+            self._log(environ, 500, 0, started)
+            raise
+        return _CountingIterable(app_iter, lambda sent: self._log(
+            environ, status[0] if status else 500, sent, started))
+
+    def _log(self, environ, status, sent, started):
+        elapsed = time.perf_counter() - started
+        latency_ms = elapsed * 1000
+        route = environ.get(ROUTE_KEY)
+        if self.observer is not None:
+            self.observer(route, environ.get('REQUEST_METHOD'), status, elapsed, sent)
+        rate = self.sample_rates.get(route, 1.0)
+        if rate < 1.0 and status < 500 and latency_ms < self.slow_ms and random.random() >= rate:
+            return
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        entry = {
+            'method': environ.get('REQUEST_METHOD'),
+            'route': route,
+            'path': environ.get('PATH_INFO'),
+            'status': status,
+            'bytes': sent,
+            'latency_ms': round(latency_ms, 2),
+            'worker': os.getpid(),
+        }
+        if rate < 1.0:
+            entry['sample'] = rate
+        self.logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+class _CountingIterable:
+    """Пропускает тело ответа, считая байты; on_close - после отдачи целиком"""
+
+    def __init__(self, app_iter, on_close):
+        self._app_iter = app_iter
+        self._on_close = on_close
+        self._sent = 0
+
+    def __iter__(self):
+        for chunk in self._app_iter:
+            self._sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self._app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._on_close(self._sent)
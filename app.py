@@ -1,29 +1,94 @@
-from flask import Flask, request, jsonify, render_template_string
+import time
+BOOT_STARTED = time.perf_counter()  # до импортов - чтобы фаза imports была честной
+
+from flask import Flask, request, jsonify, make_response, g, after_this_request
 from flask_cors import CORS
 from datetime import datetime
 import os
 import json
+import re
+import tempfile
+import base64
+from bisect import bisect_right
 import threading
-import time
-import requests
 import logging
 from functools import wraps
 
+from accesslog import ROUTE_KEY, AccessLogMiddleware, DroppingQueueHandler, parse_sample_rates, setup_logging
+from compression import CompressionMiddleware
+from metrics import Metrics
+from encoding import dumps
+from journal import Journal
+from store import MemoryStore
+
+# === ФАЗЫ ЗАПУСКА ===
+# На бесплатном плане Render каждая секунда старта - это ожидание
+# пользователя после сна; длительности фаз видны в /api/health
+BOOT_PHASES = {}
+
+def boot_phase(name, started):
+    BOOT_PHASES[f'{name}_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+boot_phase('imports', BOOT_STARTED)
+
 app = Flask(__name__)
 CORS(app)
+# Сжатие ответов /api/* крупнее порога (мелкие вроде /api/ping не трогаем)
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+# Профилирование по запросу (PROFILE_ENABLED=1): запрос с заголовком
+# X-Profile (равным PROFILE_TOKEN, если он задан) или доля PROFILE_SAMPLE
+# выполняется под cProfile; сводка по последним - /api/admin/profiles
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'suspects-profiles')
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN') or None
+if PROFILE_ENABLED:
+    from profiling import ProfilingMiddleware
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        PROFILE_DIR,
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE', 0)),
+        token=PROFILE_TOKEN,
+        keep=int(os.environ.get('PROFILE_KEEP', 200)),
+    )
+# Access-лог снаружи сжатия - в bytes попадает то, что реально ушло клиенту.
+# ACCESS_LOG_SAMPLE - доля записываемых запросов для частых маршрутов
+metrics = Metrics()
+app.wsgi_app = AccessLogMiddleware(
+    app.wsgi_app,
+    logging.getLogger('access'),
+    parse_sample_rates(os.environ.get('ACCESS_LOG_SAMPLE', '/api/ping=0.1,/api/health=0.1')),
+    slow_ms=float(os.environ.get('ACCESS_LOG_SLOW_MS', 1000)),
+    observer=metrics.observe_request,
+)
 
 # === НАСТРОЙКИ АНТИ-СНА ===
-PING_INTERVAL = 300  # Пинг каждые 5 минут (вместо 10)
-RENDER_EXTERNAL_URL = os.environ.get('RENDER_EXTERNAL_URL', None)
+# Сам пинг - в keepwarm.py (KEEPWARM_INTERVAL, KEEPWARM_JITTER, KEEPWARM_PATH)
 IS_RENDER = os.environ.get('RENDER', False)
 PORT = int(os.environ.get('PORT', 5000))
+# Достраивать индексы в фоне после первого запроса (0 - только по требованию)
+WARM_UP = os.environ.get('WARM_UP', '1') != '0'
+
+# === НАСТРОЙКИ ХРАНЕНИЯ ===
+# Пустая строка в DATA_DIR отключает запись на диск
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+JOURNAL_COMPACT_EVERY = int(os.environ.get('JOURNAL_COMPACT_EVERY', 1000))
+JOURNAL_FSYNC = os.environ.get('JOURNAL_FSYNC', '1') != '0'
+# memory - всё в памяти процесса (один воркер); sqlite - общая база на диске,
+# с ней gunicorn можно запускать с -w N по числу ядер
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'memory')
+SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(DATA_DIR or '.', 'suspects.db')
+# Сколько последних операций (с надгробиями удалений) помнит журнал изменений;
+# клиенту, отставшему сильнее, нужна полная перезагрузка
+CHANGELOG_SIZE = int(os.environ.get('CHANGELOG_SIZE', 10000))
+# Фильтры поиска по колонкам NumPy, если он установлен (0 - всегда по множествам id)
+COLUMNAR_INDEX = os.environ.get('COLUMNAR_INDEX', '1') != '0'
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования: запись в лог - только постановка в очередь
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # === БАЗА ДАННЫХ ===
-suspects_db = [
+SEED_SUSPECTS = [
     {
         "id": 1,
         "full_name": "Мокшанкин Дмитрий Алексеевич",
@@ -62,66 +127,103 @@ suspects_db = [
     }
 ]
 
-next_id = 3
+SEED_NEXT_ID = 3
 
-# === СИСТЕМА АНТИ-СНА ===
+# === ПЕРСИСТЕНТНОСТЬ ===
+def load_store():
+    """Хранилище выбранного бэкенда. Для памяти - из снапшота и журнала
+    (или из стартовых записей)"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_store import SQLiteStore
+        return SQLiteStore(SQLITE_PATH, SEED_SUSPECTS, SEED_NEXT_ID, CHANGELOG_SIZE)
+    if STORAGE_BACKEND != 'memory':
+        raise ValueError(f"Неизвестный STORAGE_BACKEND: {STORAGE_BACKEND}")
 
-def self_ping_worker():
-    """Агрессивный пинг каждые 5 минут"""
-    if not IS_RENDER or not RENDER_EXTERNAL_URL:
-        logger.info("Анти-сон: режим разработки, пинг не требуется")
-        return
-    
-    logger.info(f"🚀 Анти-сон активирован! URL: {RENDER_EXTERNAL_URL}")
-    
-    while True:
-        try:
-            # Основной пинг
-            response = requests.get(
-                f"{RENDER_EXTERNAL_URL}/api/ping",
-                timeout=15,
-                headers={'User-Agent': 'Render-AntiSleep/1.0'}
-            )
-            logger.info(f"✅ Пинг успешен: {response.status_code}")
-            
-            # Дополнительный пинг к health check
-            requests.get(
-                f"{RENDER_EXTERNAL_URL}/api/health",
-                timeout=15,
-                headers={'User-Agent': 'Render-AntiSleep/1.0'}
-            )
-            
-            # Получаем статистику для активности
-            requests.get(
-                f"{RENDER_EXTERNAL_URL}/api/stats",
-                timeout=15,
-                headers={'User-Agent': 'Render-AntiSleep/1.0'}
-            )
-            
-        except requests.exceptions.Timeout:
-            logger.warning("⚠️ Таймаут пинга - сервер просыпается")
-        except requests.exceptions.ConnectionError:
-            logger.warning("🔴 Ошибка соединения - сервер спит")
-        except Exception as e:
-            logger.error(f"❌ Ошибка пинга: {e}")
-        
-        # Ждем 5 минут
-        time.sleep(PING_INTERVAL)
-
-def start_anti_sleep():
-    """Запуск системы анти-сна в отдельном потоке"""
-    if IS_RENDER:
-        thread = threading.Thread(target=self_ping_worker, daemon=True)
-        thread.start()
-        logger.info("🛡️ Защита от сна запущена (интервал: 5 минут)")
-
-# === ДЕКОРАТОР ДЛЯ ЛОГИРОВАНИЯ ===
-def log_request(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        logger.info(f"📨 {request.method} {request.path}")
-        return f(*args, **kwargs)
-    return decorated_function
+    journal = Journal(DATA_DIR, JOURNAL_COMPACT_EVERY, JOURNAL_FSYNC) if DATA_DIR else None
+    if journal:
+        records, next_id, version = journal.load(SEED_SUSPECTS, SEED_NEXT_ID)
+    else:
+        records, next_id, version = SEED_SUSPECTS, SEED_NEXT_ID, 0
+    return MemoryStore(records, next_id, journal, version, CHANGELOG_SIZE, lazy=True, columnar=COLUMNAR_INDEX)
+
+_started = time.perf_counter()
+store = load_store()
+boot_phase('data_load', _started)
+
+# === ACCESS-ЛОГ ===
+@app.before_request
+def remember_route():
+    # Шаблон маршрута (/api/suspects/<int:suspect_id>) вместо пути - для
+    # сэмплирования и группировки в логе
+    if request.url_rule is not None:
+        request.environ[ROUTE_KEY] = request.url_rule.rule
+
+# === СНАПШОТ НА ЗАПРОС ===
+def current_snapshot():
+    """Один снапшот хранилища на весь запрос: ETag, подсчёт и выдача
+    гарантированно описывают одно и то же состояние"""
+    if 'snapshot' not in g:
+        snapshot = g.snapshot = store.snapshot()
+
+        @after_this_request
+        def close_when_sent(response):
+            # Закрываем, когда ответ отдан целиком (потоковый - тоже)
+            response.call_on_close(snapshot.close)
+            return response
+    return g.snapshot
+
+@app.teardown_request
+def close_snapshot(exc):
+    # Обработчик упал - after_this_request не сработает
+    if exc is not None and 'snapshot' in g:
+        g.snapshot.close()
+
+# === УСЛОВНЫЕ ЗАПРОСЫ (ETag) ===
+# Метка версии '<эпоха>-<версия>': после потери данных версии идут с нуля,
+# но эпоха другая, так что старые ETag и since не совпадут с новыми
+VERSION_TAG = re.compile(r'([0-9a-f]{8})-([0-9]+)')
+
+def version_tag(snapshot):
+    return f'{snapshot.epoch:08x}-{snapshot.version}'
+
+def parse_version_tag(value, snapshot):
+    """Версия из метки; None - метка другой эпохи (или голое число из
+    старого клиента), с ней нужна полная перезагрузка. ValueError - не метка"""
+    match = VERSION_TAG.fullmatch(value)
+    if match is None:
+        if is_number(value):
+            return None
+        raise ValueError(value)
+    if int(match[1], 16) != snapshot.epoch:
+        return None
+    return int(match[2])
+
+def conditional(salt=None, found=None):
+    """ETag из версии данных: при совпадении If-None-Match сразу 304,
+    без вызова обработчика и сериализации. salt - доп. часть тега для
+    ответов, зависящих не только от данных (например, от текущего года).
+    found(**kwargs) - есть ли ресурс: если нет, обработчик отвечает сам (404)."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if found is not None and not found(**kwargs):
+                return f(*args, **kwargs)
+            tag = version_tag(current_snapshot())
+            etag = tag if salt is None else f"{tag}-{salt()}"
+            if wants_ndjson():
+                etag += '-ndjson'
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            return response
+        return decorated_function
+    return decorator
 
 # === ВСТРОЕННЫЙ HTML ===
 INDEX_HTML = """<!DOCTYPE html>
@@ -345,12 +447,16 @@ INDEX_HTML = """<!DOCTYPE html>
             };
         }
 
+        function setOnline() {
+            document.getElementById('statusIndicator').className = 'status-indicator';
+            document.getElementById('statusText').textContent = '🟢 Соединение установлено';
+        }
+
         async function checkConnection() {
             try {
                 const response = await fetch(`${API_URL}/ping`);
                 if (response.ok) {
-                    document.getElementById('statusIndicator').className = 'status-indicator';
-                    document.getElementById('statusText').textContent = '🟢 Соединение установлено';
+                    setOnline();
                     return true;
                 }
             } catch (error) {
@@ -360,37 +466,169 @@ INDEX_HTML = """<!DOCTYPE html>
             }
         }
 
-        setInterval(checkConnection, 10000);
-        checkConnection();
+        function setOffline() {
+            document.getElementById('statusIndicator').className = 'status-indicator offline';
+            document.getElementById('statusText').textContent = '🟡 Сервер засыпает...';
+        }
+
+        // Последний загруженный список: редактирование берёт запись отсюда
+        const suspectsById = new Map();
+        let viewMode = 'all';      // 'all' - весь список, 'search' - результаты поиска
+        let searchStale = false;   // пришли изменения, пока показан поиск
+        // Идёт догрузка списка по страницам: дельты для id дальше последней
+        // загруженной записи (frontier) только запоминаются в touched -
+        // карточку нарисует её страница или конец догрузки
+        let loading = null;
+        let loadGeneration = 0;
+
+        // === Лента изменений (SSE) ===
+        // Изменения и heartbeat приходят с сервера; /ping опрашиваем, только
+        // если SSE недоступен
+        let events = null;
+        let knownVersion = null;
+        let pollTimer = null;
+        let heartbeatTimer = null;
+        let statsTimer = null;
+
+        function startPolling() {
+            if (!pollTimer) pollTimer = setInterval(pollChanges, 10000);
+        }
 
-        async function loadStats() {
+        // Без SSE: забираем только изменения с известной версии
+        async function pollChanges() {
+            if (knownVersion === null) return checkConnection();
             try {
-                const response = await fetch(`${API_URL}/stats`);
-                const stats = await response.json();
-                const statsHtml = `
-                    <div class="stat-card"><h3>Всего</h3><div class="stat-number">${stats.total || 0}</div></div>
-                    <div class="stat-card"><h3>Кибер-терроризм</h3><div class="stat-number">${stats.by_crime_type?.['кибер-терроризм'] || 0}</div></div>
-                    <div class="stat-card"><h3>Кибер-экстремизм</h3><div class="stat-number">${stats.by_crime_type?.['кибер-экстремизм'] || 0}</div></div>
-                    <div class="stat-card"><h3>Высокий риск</h3><div class="stat-number">${stats.by_danger_level?.['высокий'] || 0}</div></div>
-                `;
-                document.getElementById('stats').innerHTML = statsHtml;
+                const response = await fetch(`${API_URL}/suspects/changes?since=${knownVersion}`);
+                if (response.status === 410) return loadAllSuspects();
+                if (!response.ok) throw new Error(response.status);
+                const data = await response.json();
+                setOnline();
+                data.data.forEach(applyPut);
+                data.deleted.forEach(applyDelete);
+                if (data.version !== knownVersion) {
+                    knownVersion = data.version;
+                    changesApplied();
+                }
             } catch (error) {
-                console.error(error);
+                setOffline();
             }
         }
 
+        function alive() {
+            setOnline();
+            clearTimeout(heartbeatTimer);
+            // Два пропущенных heartbeat подряд - соединение потеряно
+            heartbeatTimer = setTimeout(setOffline, 35000);
+        }
+
+        function liveUpdates() {
+            return events && events.readyState === EventSource.OPEN;
+        }
+
+        function connectEvents() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            if (events) events.close();
+            events = new EventSource(`${API_URL}/suspects/events?since=${knownVersion}`);
+            events.onopen = alive;
+            events.addEventListener('heartbeat', alive);
+            events.addEventListener('put', e => applyPut(JSON.parse(e.data)));
+            events.addEventListener('delete', e => applyDelete(JSON.parse(e.data).id));
+            events.addEventListener('version', e => {
+                knownVersion = JSON.parse(e.data).version;
+                alive();
+                changesApplied();
+            });
+            events.addEventListener('resync', () => {
+                events.close();
+                events = null;
+                loadAllSuspects();
+            });
+            events.onerror = () => {
+                setOffline();
+                // Браузер сдался (503 - нет мест, или сервер спит) - опрашиваем сами
+                if (events.readyState === EventSource.CLOSED) startPolling();
+            };
+        }
+
+        function refreshStats() {
+            clearTimeout(statsTimer);
+            statsTimer = setTimeout(async () => {
+                try {
+                    renderStats(await (await fetch(`${API_URL}/stats`)).json());
+                } catch (error) {}
+            }, 500);
+        }
+
+        function renderStats(stats) {
+            const statsHtml = `
+                <div class="stat-card"><h3>Всего</h3><div class="stat-number">${stats.total || 0}</div></div>
+                <div class="stat-card"><h3>Кибер-терроризм</h3><div class="stat-number">${stats.by_crime_type?.['кибер-терроризм'] || 0}</div></div>
+                <div class="stat-card"><h3>Кибер-экстремизм</h3><div class="stat-number">${stats.by_crime_type?.['кибер-экстремизм'] || 0}</div></div>
+                <div class="stat-card"><h3>Высокий риск</h3><div class="stat-number">${stats.by_danger_level?.['высокий'] || 0}</div></div>
+            `;
+            document.getElementById('stats').innerHTML = statsHtml;
+        }
+
+        // Статистика и первая страница одним запросом, остальное - следом по курсору
         async function loadAllSuspects() {
+            const generation = ++loadGeneration;
+            let state = null;
             try {
-                const response = await fetch(`${API_URL}/suspects`);
+                const response = await fetch(`${API_URL}/bootstrap`);
                 const data = await response.json();
-                displaySuspects(data.data);
-                document.getElementById('resultsCount').textContent = `${data.count || 0} записей`;
-                loadStats();
+                if (generation !== loadGeneration) return;
+                setOnline();
+                viewMode = 'all';
+                knownVersion = data.version;
+                if (!events) connectEvents();
+                renderStats(data.stats);
+                state = loading = {frontier: 0, touched: new Set()};
+                suspectsById.clear();
+                document.getElementById('suspectsList').innerHTML = '';
+                document.getElementById('resultsCount').textContent = `${data.suspects.count || 0} записей`;
+                appendPage(data.suspects.data);
+                let cursor = data.suspects.next_cursor;
+                while (cursor) {
+                    const page = await (await fetch(`${API_URL}/suspects?limit=1000&cursor=${encodeURIComponent(cursor)}`)).json();
+                    // Начали поиск или новую загрузку - эта больше не нужна
+                    if (generation !== loadGeneration || viewMode !== 'all') return;
+                    appendPage(page.data);
+                    cursor = page.next_cursor;
+                }
+                loading = null;
+                // Изменённые и новые записи, которых не было на страницах
+                [...state.touched].sort((a, b) => a - b).forEach(id => {
+                    if (suspectsById.has(id)) applyPut(suspectsById.get(id));
+                });
+                if (suspectsById.size === 0) document.getElementById('suspectsList').innerHTML = EMPTY_LIST;
+                document.getElementById('resultsCount').textContent = `${suspectsById.size} записей`;
             } catch (error) {
-                showWakeUpMessage();
+                if (generation === loadGeneration) showWakeUpMessage();
+            } finally {
+                if (state && loading === state) loading = null;
             }
         }
 
+        // Карточки страницы дописываются в конец списка. Для id из touched
+        // дельта не старше страницы: берём её, удалённые пропускаем
+        function appendPage(page) {
+            const shown = [];
+            page.forEach(s => {
+                if (loading.touched.delete(s.id)) {
+                    s = suspectsById.get(s.id);
+                    if (!s) return;
+                } else {
+                    suspectsById.set(s.id, s);
+                }
+                shown.push(s);
+            });
+            if (page.length) loading.frontier = page[page.length - 1].id;
+            document.getElementById('suspectsList').insertAdjacentHTML('beforeend', shown.map(cardHtml).join(''));
+        }
+
         async function searchSuspects() {
             const query = document.getElementById('searchInput').value;
             const crimeType = document.getElementById('crimeTypeFilter').value;
@@ -403,6 +641,8 @@ INDEX_HTML = """<!DOCTYPE html>
             if (status) url += `&status=${status}`;
             
             try {
+                viewMode = 'search';
+                searchStale = false;
                 const response = await fetch(url);
                 const data = await response.json();
                 displaySuspects(data.data);
@@ -431,37 +671,78 @@ INDEX_HTML = """<!DOCTYPE html>
             } catch (error) {}
         }
 
+        const EMPTY_LIST = '<div style="text-align: center; padding: 50px;">🔍 Ничего не найдено</div>';
+
+        function cardHtml(s) {
+            const dangerClass = `danger-${s.danger_level === 'высокий' ? 'high' : s.danger_level === 'средний' ? 'medium' : 'low'}`;
+            return `
+                <div class="suspect-card ${dangerClass}" data-id="${s.id}">
+                    <div class="card-header">
+                        <div>
+                            <div class="suspect-name">${escapeHtml(s.full_name)}</div>
+                            <div class="case-number">Дело № ${s.case_number || 'Н/Д'}</div>
+                        </div>
+                        <span class="status-badge">${s.status}</span>
+                    </div>
+                    <div class="alias-container">${(s.alias || []).map(a => `<span class="alias-tag">${escapeHtml(a)}</span>`).join('')}</div>
+                    <div class="info-row"><span class="info-label">Дата рождения:</span><span class="info-value">${s.date_of_birth || 'Н/Д'}</span></div>
+                    <div class="info-row"><span class="info-label">Место рождения:</span><span class="info-value">${escapeHtml(s.birth_place) || 'Н/Д'}</span></div>
+                    <div class="info-row"><span class="info-label">Преступление:</span><span class="info-value">${s.crime_type}</span></div>
+                    <div class="info-row"><span class="info-label">Детали:</span><span class="info-value">${escapeHtml(s.crime_details) || 'Н/Д'}</span></div>
+                    <div class="info-row"><span class="info-label">Последнее появление:</span><span class="info-value">${s.last_seen || 'Н/Д'} ${s.last_seen_location ? `, ${escapeHtml(s.last_seen_location)}` : ''}</span></div>
+                    <div class="card-actions">
+                        <button class="btn btn-warning" onclick="editSuspect(${s.id})">✏️ Редактировать</button>
+                        <button class="btn btn-danger" onclick="openDeleteModal(${s.id}, '${escapeHtml(s.full_name)}')">🗑️ Удалить</button>
+                    </div>
+                </div>
+            `;
+        }
+
         function displaySuspects(suspects) {
+            suspectsById.clear();
+            (suspects || []).forEach(s => suspectsById.set(s.id, s));
             if (!suspects || suspects.length === 0) {
-                document.getElementById('suspectsList').innerHTML = '<div style="text-align: center; padding: 50px;">🔍 Ничего не найдено</div>';
+                document.getElementById('suspectsList').innerHTML = EMPTY_LIST;
                 return;
             }
-            
-            const html = suspects.map(s => {
-                const dangerClass = `danger-${s.danger_level === 'высокий' ? 'high' : s.danger_level === 'средний' ? 'medium' : 'low'}`;
-                return `
-                    <div class="suspect-card ${dangerClass}">
-                        <div class="card-header">
-                            <div>
-                                <div class="suspect-name">${escapeHtml(s.full_name)}</div>
-                                <div class="case-number">Дело № ${s.case_number || 'Н/Д'}</div>
-                            </div>
-                            <span class="status-badge">${s.status}</span>
-                        </div>
-                        <div class="alias-container">${(s.alias || []).map(a => `<span class="alias-tag">${escapeHtml(a)}</span>`).join('')}</div>
-                        <div class="info-row"><span class="info-label">Дата рождения:</span><span class="info-value">${s.date_of_birth || 'Н/Д'}</span></div>
-                        <div class="info-row"><span class="info-label">Место рождения:</span><span class="info-value">${escapeHtml(s.birth_place) || 'Н/Д'}</span></div>
-                        <div class="info-row"><span class="info-label">Преступление:</span><span class="info-value">${s.crime_type}</span></div>
-                        <div class="info-row"><span class="info-label">Детали:</span><span class="info-value">${escapeHtml(s.crime_details) || 'Н/Д'}</span></div>
-                        <div class="info-row"><span class="info-label">Последнее появление:</span><span class="info-value">${s.last_seen || 'Н/Д'} ${s.last_seen_location ? `, ${escapeHtml(s.last_seen_location)}` : ''}</span></div>
-                        <div class="card-actions">
-                            <button class="btn btn-warning" onclick="editSuspect(${s.id})">✏️ Редактировать</button>
-                            <button class="btn btn-danger" onclick="openDeleteModal(${s.id}, '${escapeHtml(s.full_name)}')">🗑️ Удалить</button>
-                        </div>
-                    </div>
-                `;
-            }).join('');
-            document.getElementById('suspectsList').innerHTML = html;
+            document.getElementById('suspectsList').innerHTML = suspects.map(cardHtml).join('');
+        }
+
+        // === Дельты из ленты изменений ===
+        function applyPut(s) {
+            if (viewMode !== 'all') { searchStale = true; return; }
+            suspectsById.set(s.id, s);
+            if (loading && s.id > loading.frontier) { loading.touched.add(s.id); return; }
+            const list = document.getElementById('suspectsList');
+            const card = list.querySelector(`[data-id="${s.id}"]`);
+            if (card) {
+                card.outerHTML = cardHtml(s);
+                return;
+            }
+            const cards = [...list.querySelectorAll('[data-id]')];
+            if (cards.length === 0) list.innerHTML = '';
+            const next = cards.find(el => Number(el.dataset.id) > s.id);
+            if (next) next.insertAdjacentHTML('beforebegin', cardHtml(s));
+            else list.insertAdjacentHTML('beforeend', cardHtml(s));
+        }
+
+        function applyDelete(id) {
+            if (viewMode !== 'all') { searchStale = true; return; }
+            suspectsById.delete(id);
+            if (loading && id > loading.frontier) { loading.touched.add(id); return; }
+            const card = document.querySelector(`#suspectsList [data-id="${id}"]`);
+            if (card) card.remove();
+            if (suspectsById.size === 0 && !loading) document.getElementById('suspectsList').innerHTML = EMPTY_LIST;
+        }
+
+        function changesApplied() {
+            if (viewMode === 'all') {
+                // Пока идёт догрузка, в suspectsById не все записи - счётчик обновит её конец
+                if (!loading) document.getElementById('resultsCount').textContent = `${suspectsById.size} записей`;
+            } else if (searchStale) {
+                searchSuspects();
+            }
+            refreshStats();
         }
 
         function escapeHtml(text) {
@@ -487,12 +768,17 @@ INDEX_HTML = """<!DOCTYPE html>
             document.getElementById('suspectModal').classList.add('active');
         }
 
+        async function fetchSuspect(id) {
+            if (suspectsById.has(id)) return suspectsById.get(id);
+            const response = await fetch(`${API_URL}/suspects?ids=${id}`);
+            const result = await response.json();
+            return result.data && result.data[0];
+        }
+
         async function editSuspect(id) {
             try {
-                const response = await fetch(`${API_URL}/suspects/${id}`);
-                const result = await response.json();
-                if (result.status === 'success') {
-                    const s = result.data;
+                const s = await fetchSuspect(id);
+                if (s) {
                     document.getElementById('modalTitle').textContent = '✏️ Редактировать';
                     document.getElementById('suspectId').value = s.id;
                     document.getElementById('fullName').value = s.full_name || '';
@@ -544,7 +830,8 @@ INDEX_HTML = """<!DOCTYPE html>
                 });
                 if (response.ok) {
                     closeModal();
-                    loadAllSuspects();
+                    // С лентой изменений запись придёт дельтой
+                    if (!liveUpdates()) pollChanges();
                 }
             } catch (error) {
                 alert('Ошибка сохранения');
@@ -568,7 +855,7 @@ INDEX_HTML = """<!DOCTYPE html>
                 const response = await fetch(`${API_URL}/suspects/${deleteId}`, {method: 'DELETE'});
                 if (response.ok) {
                     closeDeleteModal();
-                    loadAllSuspects();
+                    if (!liveUpdates()) pollChanges();
                 }
             } catch (error) {
                 alert('Ошибка удаления');
@@ -581,70 +868,275 @@ INDEX_HTML = """<!DOCTYPE html>
 
         window.onload = async function() {
             showWakeUpMessage();
-            try {
-                await fetch(`${API_URL}/ping`);
-                loadStats();
-                loadAllSuspects();
-            } catch (error) {}
+            loadAllSuspects();
         };
     </script>
 </body>
 </html>"""
 
+# === ГЛАВНАЯ СТРАНИЦА ===
+def build_index_variants():
+    """Рендерит страницу один раз и готовит варианты по Content-Encoding"""
+    html = app.jinja_env.from_string(INDEX_HTML).render().encode('utf-8')
+    import gzip
+    import hashlib
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    digest = hashlib.sha1(html).hexdigest()[:16]
+    variants = {'identity': html, 'gzip': gzip.compress(html, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(html, quality=11)
+    # Сжатые варианты - другие байты, значит и сильный ETag у них свой
+    return {
+        encoding: (body, digest if encoding == 'identity' else f"{digest}-{encoding}")
+        for encoding, body in variants.items()
+    }
+
+_index_variants = None
+_index_variants_lock = threading.Lock()
+
+def index_variants():
+    """Варианты страницы; собираются при первом обращении или в warm_up"""
+    global _index_variants
+    if _index_variants is None:
+        with _index_variants_lock:
+            if _index_variants is None:
+                _index_variants = build_index_variants()
+    return _index_variants
+
+def negotiate_index_encoding():
+    accept = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in index_variants() and accept[encoding]:
+            return encoding
+    return 'identity'
+
 # === ОСНОВНЫЕ МАРШРУТЫ ===
 @app.route('/')
-@log_request
 def index():
-    return render_template_string(INDEX_HTML)
+    encoding = negotiate_index_encoding()
+    body, etag = index_variants()[encoding]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    # Страница меняется с деплоем - каждый раз сверяемся по ETag (дёшево: 304)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/api/ping', methods=['GET'])
-@log_request
 def ping():
     return jsonify({
         'status': 'active',
         'timestamp': datetime.now().isoformat(),
         'environment': 'render' if IS_RENDER else 'development',
-        'suspects_count': len(suspects_db)
+        'suspects_count': len(store)
     })
 
 @app.route('/api/health', methods=['GET'])
-@log_request
 def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'uptime': time.time() - start_time
+        'uptime': time.time() - start_time,
+        'boot': BOOT_PHASES,
+        'keep_warm': read_keep_warm_state()
     })
 
+def read_keep_warm_state():
+    import keepwarm
+    return keepwarm.read_state()
+
+# === ПАГИНАЦИЯ И ПРОЕКЦИЯ ===
+MAX_PAGE_SIZE = 1000
+SUSPECT_FIELDS = frozenset(SEED_SUSPECTS[0])
+
+def is_number(value):
+    """Только цифры ASCII: isdigit() пропускает и '²', которое int() не разберёт"""
+    return value.isascii() and value.isdigit()
+
+def encode_cursor(last_id):
+    raw = json.dumps({'after': last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return int(json.loads(raw)['after'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Неверный курсор') from None
+
+def parse_page_args():
+    """Читает limit, cursor и fields из строки запроса"""
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not is_number(limit) or int(limit) < 1:
+            raise ValueError('limit должен быть положительным числом')
+        limit = min(int(limit), MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in SUSPECT_FIELDS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+    return limit, after, fields or None
+
+def paged_response(snapshot, ids):
+    """Ответ со списком: count - все совпадения, data - страница из limit записей
+    после cursor, урезанная до fields. Записи за пределами страницы не собираются."""
+    try:
+        limit, after, fields = parse_page_args()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    start = bisect_right(ids, after) if after is not None else 0
+    end = len(ids) if limit is None else min(start + limit, len(ids))
+    page_ids = ids[start:end]
+    extra = {'status': 'success'}
+    if limit is not None:
+        extra['next_cursor'] = encode_cursor(ids[end - 1]) if end < len(ids) else None
+
+    if wants_ndjson():
+        response = app.response_class(stream_ndjson(snapshot, page_ids, fields), mimetype=NDJSON_MIMETYPE)
+        response.headers['X-Total-Count'] = str(len(ids))
+        if limit is not None and extra['next_cursor']:
+            response.headers['X-Next-Cursor'] = extra['next_cursor']
+        return response
+
+    body = stream_json(snapshot, len(ids), page_ids, fields, extra)
+    # Длинный список уходит потоком; stream=1 / stream=0 - принудительно
+    stream = request.args.get('stream')
+    if stream == '0' or (stream != '1' and len(page_ids) < STREAM_MIN_RECORDS):
+        body = b''.join(body)
+    return app.response_class(body, mimetype='application/json')
+
+# === ПОТОКОВАЯ ВЫДАЧА ===
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_CHUNK = 200  # записей на один кусок chunked-ответа
+# С этого числа записей список отдаётся chunked-потоком, не собираясь в памяти
+# целиком (полный список без limit); короткий - одним телом с Content-Length
+STREAM_MIN_RECORDS = int(os.environ.get('STREAM_MIN_RECORDS', MAX_PAGE_SIZE))
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def project(records, fields):
+    return [{f: s.get(f) for f in fields} for s in records]
+
+def encode_records(snapshot, ids, fields):
+    """JSON-фрагменты записей: готовые из кэша хранилища или, при fields,
+    закодированные заново после проекции"""
+    if fields:
+        return [dumps(s) for s in project(snapshot.get_many(ids), fields)]
+    return snapshot.encoded_many(ids)
+
+def iter_chunks(snapshot, ids, fields):
+    """Фрагменты кусками по STREAM_CHUNK: в памяти никогда не больше одного куска.
+    Генератор держит свой снапшот, так что поток согласован до конца."""
+    for start in range(0, len(ids), STREAM_CHUNK):
+        chunk = encode_records(snapshot, ids[start:start + STREAM_CHUNK], fields)
+        if chunk:
+            yield chunk
+
+def stream_json(snapshot, count, ids, fields, extra):
+    """Тот же JSON, что отдал бы jsonify, собранный из готовых фрагментов"""
+    yield b'{"count":%d,"data":[' % count
+    separator = b''
+    for chunk in iter_chunks(snapshot, ids, fields):
+        yield separator + b','.join(chunk)
+        separator = b','
+    # Ключи после "data" по алфавиту - как при sort_keys у jsonify
+    tail = b','.join(dumps(k) + b':' + dumps(v) for k, v in sorted(extra.items()))
+    yield b'],' + tail + b'}\n'
+
+def stream_ndjson(snapshot, ids, fields):
+    for chunk in iter_chunks(snapshot, ids, fields):
+        yield b'\n'.join(chunk) + b'\n'
+
 # === API ЭНДПОИНТЫ ===
 @app.route('/api/suspects', methods=['GET'])
-@log_request
+@conditional()
 def get_all_suspects():
-    return jsonify({
-        'status': 'success',
-        'count': len(suspects_db),
-        'data': suspects_db
-    })
+    snapshot = current_snapshot()
+    if 'ids' in request.args:
+        # Пакетная выборка: ?ids=1,2,3 - найденные записи по возрастанию id
+        try:
+            wanted = parse_id_list(request.args['ids'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return paged_response(snapshot, snapshot.existing_ids(wanted))
+    return paged_response(snapshot, snapshot.ids())
+
+def parse_id_list(value):
+    """'3,1,3' -> [1, 3]"""
+    parts = [part.strip() for part in value.split(',') if part.strip()]
+    if not all(is_number(part) for part in parts):
+        raise ValueError('ids - список целых id через запятую')
+    if len(parts) > MAX_PAGE_SIZE:
+        raise ValueError(f'Не больше {MAX_PAGE_SIZE} id за запрос')
+    return sorted({int(part) for part in parts})
+
+BOOTSTRAP_PAGE_SIZE = 100
+
+@app.route('/api/bootstrap', methods=['GET'])
+@conditional(salt=lambda: datetime.now().year)
+def bootstrap():
+    """Всё для первой отрисовки панели одним ответом: статистика и первая
+    страница списка (limit, по умолчанию BOOTSTRAP_PAGE_SIZE)"""
+    try:
+        limit, _, fields = parse_page_args()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    snapshot = current_snapshot()
+    ids = snapshot.ids()
+    page_ids = ids[:limit or BOOTSTRAP_PAGE_SIZE]
+    next_cursor = encode_cursor(page_ids[-1]) if len(page_ids) < len(ids) else None
+    stats = snapshot.stats.snapshot(datetime.now().year)
+    body = (b'{"stats":' + dumps(stats)
+            + b',"status":"success","suspects":{"count":%d,"data":[' % len(ids)
+            + b','.join(encode_records(snapshot, page_ids, fields))
+            + b'],"next_cursor":' + dumps(next_cursor)
+            + b'},"version":' + dumps(version_tag(snapshot)) + b'}\n')
+    return app.response_class(body, mimetype='application/json')
 
 @app.route('/api/suspects/<int:suspect_id>', methods=['GET'])
-@log_request
+@conditional(found=lambda suspect_id: current_snapshot().get(suspect_id) is not None)
 def get_suspect(suspect_id):
-    suspect = next((s for s in suspects_db if s['id'] == suspect_id), None)
-    if suspect:
-        return jsonify({'status': 'success', 'data': suspect})
+    data = current_snapshot().encoded(suspect_id)
+    if data:
+        return app.response_class(b'{"data":' + data + b',"status":"success"}\n',
+                                  mimetype='application/json')
     return jsonify({'status': 'error', 'message': 'Не найден'}), 404
 
 @app.route('/api/suspects', methods=['POST'])
-@log_request
 def add_suspect():
-    global next_id
     data = request.json
     
     if not data.get('full_name'):
         return jsonify({'status': 'error', 'message': 'Требуется полное имя'}), 400
     
-    new_suspect = {
-        'id': next_id,
+    # id выдаётся под блокировкой писателя, поэтому запись собирается там же
+    new_suspect = store.insert(lambda new_id: build_suspect(new_id, data))
+    return jsonify({'status': 'success', 'data': new_suspect}), 201
+
+def build_suspect(new_id, data):
+    today = datetime.now().strftime('%Y-%m-%d')
+    return {
+        'id': new_id,
         'full_name': data.get('full_name'),
         'alias': data.get('alias', []),
         'date_of_birth': data.get('date_of_birth'),
@@ -653,149 +1145,312 @@ def add_suspect():
         'crime_type': data.get('crime_type'),
         'crime_details': data.get('crime_details', ''),
         'status': data.get('status', 'в розыске'),
-        'last_seen': data.get('last_seen', datetime.now().strftime('%Y-%m-%d')),
+        'last_seen': data.get('last_seen', today),
         'last_seen_location': data.get('last_seen_location', ''),
         'danger_level': data.get('danger_level', 'средний'),
-        'added_date': datetime.now().strftime('%Y-%m-%d'),
-        'case_number': data.get('case_number', f"2026-{next_id:03d}"),
+        'added_date': today,
+        'case_number': data.get('case_number', f"2026-{new_id:03d}"),
         'investigator': data.get('investigator', ''),
         'notes': data.get('notes', '')
     }
-    
-    suspects_db.append(new_suspect)
-    next_id += 1
-    return jsonify({'status': 'success', 'data': new_suspect}), 201
+
+# Поля, которые можно менять через PUT (id, added_date и case_number - нет)
+UPDATABLE_FIELDS = (
+    'full_name', 'alias', 'date_of_birth', 'birth_place', 'nationality',
+    'crime_type', 'crime_details', 'status', 'last_seen', 'last_seen_location',
+    'danger_level', 'investigator', 'notes'
+)
 
 @app.route('/api/suspects/<int:suspect_id>', methods=['PUT'])
-@log_request
 def update_suspect(suspect_id):
-    suspect = next((s for s in suspects_db if s['id'] == suspect_id), None)
-    if not suspect:
+    if not store.get(suspect_id):
         return jsonify({'status': 'error', 'message': 'Не найден'}), 404
     
     data = request.json
-    suspect.update({
-        'full_name': data.get('full_name', suspect['full_name']),
-        'alias': data.get('alias', suspect['alias']),
-        'date_of_birth': data.get('date_of_birth', suspect['date_of_birth']),
-        'birth_place': data.get('birth_place', suspect['birth_place']),
-        'nationality': data.get('nationality', suspect['nationality']),
-        'crime_type': data.get('crime_type', suspect['crime_type']),
-        'crime_details': data.get('crime_details', suspect['crime_details']),
-        'status': data.get('status', suspect['status']),
-        'last_seen': data.get('last_seen', suspect['last_seen']),
-        'last_seen_location': data.get('last_seen_location', suspect['last_seen_location']),
-        'danger_level': data.get('danger_level', suspect['danger_level']),
-        'investigator': data.get('investigator', suspect['investigator']),
-        'notes': data.get('notes', suspect['notes'])
-    })
+    changes = {field: data[field] for field in UPDATABLE_FIELDS if field in data}
+    suspect = store.update(suspect_id, changes)
+    if not suspect:
+        return jsonify({'status': 'error', 'message': 'Не найден'}), 404
     
     return jsonify({'status': 'success', 'data': suspect})
 
 @app.route('/api/suspects/<int:suspect_id>', methods=['DELETE'])
-@log_request
 def delete_suspect(suspect_id):
-    global suspects_db
-    suspect = next((s for s in suspects_db if s['id'] == suspect_id), None)
-    if not suspect:
+    if not store.delete(suspect_id):
         return jsonify({'status': 'error', 'message': 'Не найден'}), 404
     
-    suspects_db = [s for s in suspects_db if s['id'] != suspect_id]
     return jsonify({'status': 'success', 'message': 'Удалено'})
 
+# === ПАКЕТНЫЕ ОПЕРАЦИИ ===
+MAX_BULK_OPS = int(os.environ.get('MAX_BULK_OPS', 10000))
+BULK_OPS = ('create', 'update', 'delete')
+
+class BulkRollback(Exception):
+    """Откат всей пачки при atomic=1"""
+
+def parse_bulk_body():
+    """Операции из тела запроса: JSON-массив или NDJSON (по строке на операцию)"""
+    if request.mimetype == NDJSON_MIMETYPE:
+        return [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+    ops = request.get_json(silent=True)
+    if not isinstance(ops, list):
+        raise ValueError('Ожидается JSON-массив операций')
+    return ops
+
+def validate_bulk_op(op):
+    """Текст ошибки или None, если операция корректна"""
+    if not isinstance(op, dict) or op.get('op') not in BULK_OPS:
+        return 'Операция должна быть объектом с op: create, update или delete'
+    suspect_id = op.get('id')
+    if op['op'] != 'create' and (not isinstance(suspect_id, int) or isinstance(suspect_id, bool)):
+        return 'Требуется целый id'
+    if op['op'] != 'delete' and not isinstance(op.get('data'), dict):
+        return 'Требуется объект data'
+    if op['op'] == 'create' and not op['data'].get('full_name'):
+        return 'Требуется полное имя'
+    return None
+
+def apply_bulk_op(tx, op):
+    """Выполняет проверенную операцию; результат для ответа"""
+    if op['op'] == 'create':
+        record = tx.insert(lambda new_id: build_suspect(new_id, op['data']))
+        return {'status': 'created', 'id': record['id']}
+    if op['op'] == 'update':
+        changes = {field: op['data'][field] for field in UPDATABLE_FIELDS if field in op['data']}
+        if tx.update(op['id'], changes) is None:
+            return {'status': 'error', 'id': op['id'], 'message': 'Не найден'}
+        return {'status': 'updated', 'id': op['id']}
+    if not tx.delete(op['id']):
+        return {'status': 'error', 'id': op['id'], 'message': 'Не найден'}
+    return {'status': 'deleted', 'id': op['id']}
+
+@app.route('/api/suspects/bulk', methods=['POST'])
+def bulk_suspects():
+    """Пачка create/update/delete одной транзакцией: индексы, статистика и
+    журнал обновляются один раз. С atomic=1 любая ошибка отменяет всю пачку."""
+    try:
+        ops = parse_bulk_body()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Некорректное тело: {e}'}), 400
+    if len(ops) > MAX_BULK_OPS:
+        return jsonify({'status': 'error', 'message': f'Не больше {MAX_BULK_OPS} операций'}), 413
+    atomic = request.args.get('atomic') == '1'
+
+    # Проверяем всё до захвата блокировки писателя
+    results = [None] * len(ops)
+    for index, op in enumerate(ops):
+        error = validate_bulk_op(op)
+        if error:
+            results[index] = {'status': 'error', 'message': error}
+    invalid = any(results)
+
+    applied = 0
+    if not (atomic and invalid):
+        try:
+            with store.transaction() as tx:
+                for index, op in enumerate(ops):
+                    if results[index] is None:
+                        results[index] = apply_bulk_op(tx, op)
+                        if results[index]['status'] == 'error':
+                            if atomic:
+                                raise BulkRollback()
+                        else:
+                            applied += 1
+        except BulkRollback:
+            # Ничего не записано: успешные до ошибки тоже не считаются
+            applied = 0
+            results = [r if r is not None and r['status'] == 'error' else None for r in results]
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = result = {'status': 'skipped'}
+        result['index'] = index
+    logger.info(f"📦 Пакет: применено {applied} из {len(ops)} операций")
+
+    if atomic and applied < len(ops) and ops:
+        return jsonify({'status': 'error', 'message': 'Пачка отклонена', 'applied': 0,
+                        'count': len(results), 'data': results}), 400
+    return jsonify({'status': 'success', 'applied': applied, 'count': len(results), 'data': results})
+
+# === ДЕЛЬТА-СИНХРОНИЗАЦИЯ ===
+@app.route('/api/suspects/changes', methods=['GET'])
+@conditional()
+def get_changes():
+    """Записи, созданные или изменённые после версии since, и id удалённых.
+    version в ответе - следующий since. 410 - журнал изменений since уже не
+    покрывает (или since из другой эпохи), нужна полная загрузка (например,
+    через /api/bootstrap)."""
+    since = request.args.get('since', '')
+    snapshot = current_snapshot()
+    try:
+        version = parse_version_tag(since, snapshot)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since должен быть версией'}), 400
+    changes = snapshot.changes_since(version) if version is not None else None
+    if changes is None:
+        return jsonify({'status': 'error', 'resync': True, 'version': version_tag(snapshot),
+                        'message': 'Изменения с этой версии недоступны, нужна полная загрузка'}), 410
+    updated, deleted = changes
+    body = (b'{"count":%d,"data":[' % len(updated)
+            + b','.join(snapshot.encoded_many(updated))
+            + b'],"deleted":' + dumps(deleted)
+            + b',"since":' + dumps(since)
+            + b',"status":"success","version":' + dumps(version_tag(snapshot)) + b'}\n')
+    return app.response_class(body, mimetype='application/json')
+
+# === ЛЕНТА ИЗМЕНЕНИЙ (SSE) ===
+SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))      # секунд тишины до heartbeat
+SSE_MAX_AGE = int(os.environ.get('SSE_MAX_AGE', 300))         # потом браузер переподключится сам
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 8))   # каждое соединение занимает поток
+sse_slots = threading.BoundedSemaphore(SSE_MAX_CLIENTS)
+
+def sse_event(event, data=None, event_id=None, raw=None):
+    """Одно событие text/event-stream; raw - уже готовый JSON в байтах"""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return (head + f'event: {event}\n').encode() + b'data: ' + (raw or dumps(data)) + b'\n\n'
+
+def change_events(version):
+    """put/delete для записей, изменённых после version, затем метка версии
+    с id для Last-Event-ID; в тишине - heartbeat раз в SSE_HEARTBEAT секунд.
+    version None - метка другой эпохи: сразу resync"""
+    yield b'retry: 3000\n\n'
+    deadline = time.monotonic() + SSE_MAX_AGE
+    while time.monotonic() < deadline:
+        if version is not None:
+            store.wait_for_change(version, SSE_HEARTBEAT)
+        snapshot = store.snapshot()
+        try:
+            tag = version_tag(snapshot)
+            if snapshot.version == version:
+                yield sse_event('heartbeat', {'version': tag})
+                continue
+            changes = snapshot.changes_since(version) if version is not None else None
+            if changes is None:
+                yield sse_event('resync', {'version': tag}, tag)
+                return
+            updated, deleted = changes
+            for start in range(0, len(updated), STREAM_CHUNK):
+                yield b''.join(sse_event('put', raw=data) for data in
+                               snapshot.encoded_many(updated[start:start + STREAM_CHUNK]))
+            for suspect_id in deleted:
+                yield sse_event('delete', {'id': suspect_id})
+            version = snapshot.version
+            yield sse_event('version', {'version': tag}, tag)
+        finally:
+            snapshot.close()
+
+@app.route('/api/suspects/events', methods=['GET'])
+def suspect_events():
+    """SSE-лента изменений с версии since (или Last-Event-ID при переподключении)"""
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    snapshot = store.snapshot()
+    try:
+        if since is None or since == 'null':
+            since = snapshot.version
+        else:
+            since = parse_version_tag(since, snapshot)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since должен быть версией'}), 400
+    finally:
+        snapshot.close()
+
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({'status': 'error', 'message': 'Слишком много подписчиков'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_MAX_AGE)
+        return response
+    response = app.response_class(change_events(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(sse_slots.release)
+    return response
+
 @app.route('/api/search', methods=['GET'])
-@log_request
+@conditional()
 def search_suspects():
     query = request.args.get('q', '').lower()
     crime_type = request.args.get('crime_type', '')
     danger_level = request.args.get('danger_level', '')
     status = request.args.get('status', '')
     
-    results = []
-    for suspect in suspects_db:
-        match = True
-        
-        if query:
-            match = False
-            if query in suspect['full_name'].lower():
-                match = True
-            for alias in suspect['alias']:
-                if query in alias.lower():
-                    match = True
-            if query in suspect['crime_details'].lower():
-                match = True
-            if query in suspect['birth_place'].lower():
-                match = True
-        
-        if crime_type and crime_type != suspect['crime_type']:
-            match = False
-        if danger_level and danger_level != suspect['danger_level']:
-            match = False
-        if status and status != suspect['status']:
-            match = False
-        
-        if match:
-            results.append(suspect)
-    
-    return jsonify({
-        'status': 'success',
-        'count': len(results),
-        'data': results
-    })
+    snapshot = current_snapshot()
+    with metrics.timed('search'):
+        ids = snapshot.search_ids(query, crime_type, danger_level, status)
+    return paged_response(snapshot, ids)
 
 @app.route('/api/stats', methods=['GET'])
-@log_request
+@conditional(salt=lambda: datetime.now().year)
 def get_stats():
-    stats = {
-        'total': len(suspects_db),
-        'by_crime_type': {},
-        'by_danger_level': {},
-        'by_status': {},
-        'by_city': {},
-        'by_age_group': {'до 18': 0, '18-25': 0, '26-35': 0, '36+': 0}
-    }
-    
-    current_year = datetime.now().year
-    
-    for suspect in suspects_db:
-        crime_type = suspect['crime_type']
-        stats['by_crime_type'][crime_type] = stats['by_crime_type'].get(crime_type, 0) + 1
-        
-        danger = suspect['danger_level']
-        stats['by_danger_level'][danger] = stats['by_danger_level'].get(danger, 0) + 1
-        
-        status = suspect['status']
-        stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
-        
-        city = suspect['birth_place']
-        if city:
-            stats['by_city'][city] = stats['by_city'].get(city, 0) + 1
-        
-        if suspect['date_of_birth']:
-            try:
-                birth_year = int(suspect['date_of_birth'].split('-')[0])
-                age = current_year - birth_year
-                if age < 18:
-                    stats['by_age_group']['до 18'] += 1
-                elif age < 26:
-                    stats['by_age_group']['18-25'] += 1
-                elif age < 36:
-                    stats['by_age_group']['26-35'] += 1
-                else:
-                    stats['by_age_group']['36+'] += 1
-            except:
-                pass
-    
+    with metrics.timed('stats'):
+        stats = current_snapshot().stats.snapshot(datetime.now().year)
     return jsonify(stats)
 
+# === МЕТРИКИ ===
+def store_gauges():
+    snapshot = store.snapshot()
+    try:
+        return len(snapshot), snapshot.version
+    finally:
+        snapshot.close()
+
+metrics.gauge('suspects_records', 'Записей в хранилище.', lambda: store_gauges()[0])
+metrics.gauge('suspects_store_version', 'Версия данных (растёт с каждой мутацией).',
+              lambda: store_gauges()[1])
+metrics.gauge('process_uptime_seconds', 'Время с запуска процесса.', lambda: time.time() - start_time)
+metrics.gauge('process_boot_phase_seconds', 'Длительность фаз запуска.',
+              lambda: [({'phase': name[:-3]}, ms / 1000) for name, ms in BOOT_PHASES.items()])
+metrics.gauge('log_records_dropped_total', 'Записи лога, потерянные из-за полной очереди.',
+              lambda: DroppingQueueHandler.dropped, kind='counter')
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# === ПРОФИЛИ ===
+@app.route('/api/admin/profiles', methods=['GET'])
+def get_profiles():
+    """Самые дорогие функции (по накопленному времени) за last последних
+    профилей; route - фильтр по маршруту, например api_search"""
+    if not PROFILE_ENABLED:
+        return jsonify({'status': 'error', 'message': 'Профилирование выключено'}), 404
+    if PROFILE_TOKEN is not None and request.headers.get('X-Profile-Token') != PROFILE_TOKEN:
+        return jsonify({'status': 'error', 'message': 'Нужен X-Profile-Token'}), 403
+    from profiling import top_functions
+    try:
+        last = int(request.args.get('last', 50))
+        limit = int(request.args.get('limit', 30))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'last и limit должны быть числами'}), 400
+    profiles, functions = top_functions(PROFILE_DIR, last=max(last, 1),
+                                        route=request.args.get('route'), limit=max(limit, 1))
+    return jsonify({'status': 'success', 'profiles': profiles, 'count': len(functions), 'data': functions})
+
 # === ЗАПУСК ===
 start_time = time.time()
+_first_request = threading.Lock()
+
+@app.before_request
+def on_first_request():
+    # Первый запрос воркера: фиксируем время готовности и запускаем
+    # фоновую достройку (не при импорте - чтобы не попасть под fork)
+    if not _first_request.acquire(blocking=False):
+        return
+    boot_phase('first_request', BOOT_STARTED)
+    if WARM_UP:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def warm_up():
+    started = time.perf_counter()
+    store.warm_up()
+    boot_phase('index_build', started)
+    index_variants()
 
 if __name__ == '__main__':
-    # Запускаем систему анти-сна
-    start_anti_sleep()
+    # Под gunicorn анти-сон запускает хук when_ready (gunicorn.conf.py)
+    import keepwarm
+    keepwarm.start_from_env()
     
     logger.info(f"🚀 Сервер запускается на порту {PORT}")
-    logger.info(f"📊 В базе {len(suspects_db)} подозреваемых")
+    logger.info(f"📊 В базе {len(store)} подозреваемых")
     
     app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,397 @@
+"""Нагрузочные замеры API на синтетических данных (это не тесты).
+
+    python benchmark.py                         # 1k и 100k, сравнение с базой
+    python benchmark.py --scale 1m --backend sqlite
+    python benchmark.py --gunicorn              # ещё и через локальный gunicorn
+    python benchmark.py --save-baseline         # записать результаты как базу
+
+Записи генерируются целиком (имена из слогов, случайные категории и даты)
+и кэшируются во временном каталоге по масштабу и seed. Каждый прогон идёт
+в отдельном процессе со своей копией данных: app.py читает их при импорте,
+а пиковая RSS должна относиться только к нему. Каждый сценарий крутится
+--duration секунд (но не меньше MIN_ITERATIONS раз); в отчёте пропускная
+способность, p50/p99 и пиковая RSS. Если результат хуже базы из
+BASELINE_FILE больше чем на --tolerance (и на --slack-ms/--p99-slack-ms
+для задержек), код выхода 1. База привязана к машине: на новой её нужно
+записать заново через --save-baseline.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(ROOT, 'benchmark_baseline.json')
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'suspects-bench')
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+MIN_ITERATIONS = 3
+MAX_ITERATIONS = 2000
+
+# === СИНТЕТИЧЕСКИЕ ДАННЫЕ ===
+SYLLABLES = ('ба', 'ве', 'го', 'да', 'ке', 'ло', 'ми', 'но', 'ра', 'се', 'ту', 'фа', 'хо', 'це', 'шу', 'ян')
+SURNAME_ENDINGS = ('ов', 'ин', 'ев', 'ский', 'енко')
+NICK_PARTS = ('Zero', 'Byte', 'Ghost', 'Root', 'Hex', 'Null', 'Proxy', 'Shell', 'Kern', 'Flux')
+CITIES = tuple(f'Город-{i}' for i in range(1, 41))
+CRIME_TYPES = ('кибер-терроризм', 'кибер-экстремизм')
+STATUSES = ('в розыске', 'задержан', 'под наблюдением')
+DANGER_LEVELS = ('высокий', 'средний', 'низкий')
+NATIONALITIES = ('РФ', 'РБ', 'КЗ', 'не установлено')
+
+
+def fake_word(rng, syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+
+def fake_date(rng, start, end):
+    return (start + timedelta(days=rng.randrange((end - start).days))).isoformat()
+
+
+def generate(count, seed=1):
+    """count синтетических записей в формате app.py, id с 1"""
+    rng = random.Random(seed)
+    records = []
+    for record_id in range(1, count + 1):
+        surname = fake_word(rng, 2).capitalize() + rng.choice(SURNAME_ENDINGS)
+        city = rng.choice(CITIES)
+        records.append({
+            'id': record_id,
+            'full_name': f'{surname} {fake_word(rng, 2).capitalize()} {fake_word(rng, 3).capitalize()}ович',
+            'alias': [rng.choice(NICK_PARTS) + rng.choice(NICK_PARTS) + str(rng.randrange(100))
+                      for _ in range(rng.randrange(4))],
+            'date_of_birth': fake_date(rng, date(1960, 1, 1), date(2009, 1, 1)),
+            'birth_place': city,
+            'nationality': rng.choice(NATIONALITIES),
+            'crime_type': rng.choice(CRIME_TYPES),
+            'crime_details': f'Эпизод {rng.randrange(1000)}: {fake_word(rng, 4)} {fake_word(rng, 3)}',
+            'status': rng.choice(STATUSES),
+            'last_seen': fake_date(rng, date(2024, 1, 1), date(2026, 3, 1)),
+            'last_seen_location': f'{city}, ул. {fake_word(rng, 3).capitalize()}, {rng.randrange(1, 200)}',
+            'danger_level': rng.choice(DANGER_LEVELS),
+            'added_date': fake_date(rng, date(2025, 1, 1), date(2026, 3, 1)),
+            'case_number': f'2026-{record_id:03d}',
+            'investigator': f'{fake_word(rng, 2).capitalize()}ов А.А.',
+            'notes': f'Синтетическая запись {record_id}',
+        })
+    return records
+
+
+def dataset(scale, backend, seed):
+    """Каталог с данными масштаба scale для backend (создаётся один раз)"""
+    from journal import Journal
+
+    path = os.path.join(CACHE_DIR, f'{backend}-{scale}-{seed}')
+    if os.path.exists(os.path.join(path, 'ready')):
+        return path
+    shutil.rmtree(path, ignore_errors=True)
+    started = time.perf_counter()
+    records = generate(SCALES[scale], seed)
+    if backend == 'sqlite':
+        from sqlite_store import SQLiteStore
+        os.makedirs(path)
+        SQLiteStore(os.path.join(path, 'suspects.db'), records, len(records) + 1)
+    else:
+        journal = Journal(path, fsync=False)
+        journal.compact(records, len(records) + 1, 0)
+        journal.close()
+    open(os.path.join(path, 'ready'), 'w').close()
+    print(f'🧪 {scale}/{backend}: {len(records)} записей за {time.perf_counter() - started:.1f} с', flush=True)
+    return path
+
+
+# === СЦЕНАРИИ ===
+class Scenarios:
+    """Сценарии по порядку: чтение, потом запись. Каждый - (имя, метод,
+    make() -> (путь, тело) или (путь, тело, заголовки), after(ответ) или
+    None, предел повторов)"""
+
+    def __init__(self, count, rng):
+        self.count = count
+        self.rng = rng
+        self.cursor = None  # list_page идёт по next_cursor, как клиент
+        self.created = []
+
+    def random_id(self):
+        return self.rng.randrange(1, self.count + 1)
+
+    def fragment(self):
+        return self.rng.choice(SYLLABLES) + self.rng.choice(SYLLABLES)
+
+    def page(self):
+        return '/api/suspects?limit=100' + (f'&cursor={self.cursor}' if self.cursor else ''), None
+
+    def next_page(self, payload):
+        self.cursor = json.loads(payload)['next_cursor']
+
+    def check_ndjson(self, payload):
+        # Формат выбирается по Accept: получив обычный JSON, сценарий мерил бы list_all
+        if 'id' not in json.loads(payload.split(b'\n', 1)[0]):
+            raise RuntimeError('list_ndjson: ответ не NDJSON')
+
+    def new_record(self):
+        rng = self.rng
+        return '/api/suspects', {
+            'full_name': f'{fake_word(rng, 3).capitalize()}ов Тест',
+            'crime_type': rng.choice(CRIME_TYPES),
+            'date_of_birth': fake_date(rng, date(1960, 1, 1), date(2009, 1, 1)),
+        }
+
+    def remember_created(self, payload):
+        self.created.append(json.loads(payload)['data']['id'])
+
+    def touch(self):
+        # Перед каждым замером - запись, чтобы статистика пересчитывалась
+        return f'/api/suspects/{self.random_id()}', {'notes': f'Правка {self.rng.randrange(10 ** 6)}'}
+
+    def __iter__(self):
+        rng = self.rng
+        yield 'list_page', 'GET', self.page, self.next_page, MAX_ITERATIONS
+        yield 'list_all', 'GET', lambda: ('/api/suspects', None), None, MAX_ITERATIONS
+        yield 'list_ndjson', 'GET', lambda: ('/api/suspects', None, {'Accept': 'application/x-ndjson'}), \
+            self.check_ndjson, MAX_ITERATIONS
+        yield 'bootstrap', 'GET', lambda: ('/api/bootstrap', None), None, MAX_ITERATIONS
+        yield 'get', 'GET', lambda: (f'/api/suspects/{self.random_id()}', None), None, MAX_ITERATIONS
+        yield 'get_many', 'GET', lambda: (
+            '/api/suspects?ids=' + ','.join(str(self.random_id()) for _ in range(50)), None), None, MAX_ITERATIONS
+        yield 'search_text', 'GET', lambda: (f'/api/search?q={self.fragment()}&limit=100', None), None, MAX_ITERATIONS
+        yield 'search_filter', 'GET', lambda: (
+            f'/api/search?crime_type={rng.choice(CRIME_TYPES)}&status={rng.choice(STATUSES)}&limit=100',
+            None), None, MAX_ITERATIONS
+        yield 'search_both', 'GET', lambda: (
+            f'/api/search?q={self.fragment()}&danger_level={rng.choice(DANGER_LEVELS)}&limit=100',
+            None), None, MAX_ITERATIONS
+        yield 'stats', 'GET', lambda: ('/api/stats', None), None, MAX_ITERATIONS
+        yield 'create', 'POST', self.new_record, self.remember_created, MAX_ITERATIONS
+        yield 'update', 'PUT', lambda: (
+            f'/api/suspects/{rng.choice(self.created)}', {'status': rng.choice(STATUSES)}), None, MAX_ITERATIONS
+        yield 'stats_after_write', 'GET', lambda: ('/api/stats', None), None, MAX_ITERATIONS
+        yield 'delete', 'DELETE', lambda: (f'/api/suspects/{self.created.pop()}', None), None, len(self.created)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_scenarios(send, count, duration, seed):
+    """send(метод, путь, тело, заголовки) -> (статус, байты тела); результаты по сценариям"""
+    scenarios = Scenarios(count, random.Random(seed))
+    results = {}
+    for name, method, make, after, limit in scenarios:
+        latencies = []
+        deadline = time.perf_counter() + duration
+        while len(latencies) < limit and (len(latencies) < MIN_ITERATIONS or time.perf_counter() < deadline):
+            if name == 'stats_after_write':
+                send('PUT', *scenarios.touch())
+            path, body, *headers = make()
+            headers = headers[0] if headers else None
+            started = time.perf_counter()
+            status, payload = send(method, path, body, headers)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                raise RuntimeError(f'{name}: {method} {path} -> {status}')
+            if after is not None:
+                after(payload)
+        latencies.sort()
+        results[name] = {
+            'n': len(latencies),
+            'rps': round(len(latencies) / sum(latencies), 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        }
+    return results
+
+
+# === ПРОГОНЫ ===
+def child_env(data_path, backend):
+    env = dict(os.environ, STORAGE_BACKEND=backend, WARM_UP='1', PROFILE_ENABLED='0')
+    env.pop('RENDER', None)  # без анти-сна
+    run_dir = tempfile.mkdtemp(prefix='suspects-bench-run-')
+    # Копия целиком (у SQLite рядом с базой лежит -wal): записи прогона
+    # не должны попасть в общий кэш
+    shutil.copytree(data_path, run_dir, dirs_exist_ok=True)
+    env.update(DATA_DIR=run_dir, SQLITE_PATH=os.path.join(run_dir, 'suspects.db'))
+    return env, run_dir
+
+
+def run_child(args):
+    """Прогон через тестовый клиент Flask в этом процессе (вызывается из run_client)"""
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    client = app_module.app.test_client()
+    app_module.store.warm_up()  # замеряем работу, а не достройку индексов
+
+    def send(method, path, body, headers=None):
+        response = client.open(path, method=method, json=body, headers=headers)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+    results = run_scenarios(send, SCALES[args.scale], args.duration, args.seed)
+    json.dump({
+        'scenarios': results,
+        'data_load_ms': app_module.BOOT_PHASES.get('data_load_ms'),
+        'rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, sys.stdout)
+
+
+def run_client(scale, backend, args):
+    data_path = dataset(scale, backend, args.seed)
+    env, run_dir = child_env(data_path, backend)
+    try:
+        with open(os.path.join(run_dir, 'app.log'), 'w') as log:
+            child = subprocess.run(
+                [sys.executable, __file__, '--child', '--scale', scale, '--duration', str(args.duration),
+                 '--seed', str(args.seed)],
+                env=env, stdout=subprocess.PIPE, stderr=log, cwd=ROOT)
+        if child.returncode != 0:
+            with open(os.path.join(run_dir, 'app.log')) as log:
+                sys.stderr.write(log.read()[-4000:])
+            raise RuntimeError(f'прогон {scale}/{backend} упал с кодом {child.returncode}')
+        return json.loads(child.stdout)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def worker_peak_rss_mb(master_pid):
+    """Пиковая RSS воркеров gunicorn (VmHWM из /proc, только Linux)"""
+    peak = None
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            pids = f.read().split()
+        for pid in pids:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak = max(peak or 0, int(line.split()[1]) / 1024)
+    except OSError:
+        return None
+    return round(peak, 1) if peak is not None else None
+
+
+def run_gunicorn(scale, backend, args):
+    import requests
+
+    data_path = dataset(scale, backend, args.seed)
+    env, run_dir = child_env(data_path, backend)
+    base = f'http://127.0.0.1:{args.port}'
+    log = open(os.path.join(run_dir, 'app.log'), 'w')
+    server = subprocess.Popen(['gunicorn', 'app:app', '-b', f'127.0.0.1:{args.port}', '-w', '1'],
+                              env=env, stdout=log, stderr=log, cwd=ROOT)
+    session = requests.Session()
+    try:
+        deadline = time.monotonic() + 300
+        while True:
+            try:
+                session.get(base + '/api/ping', timeout=5)
+                break
+            except requests.exceptions.ConnectionError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'gunicorn не поднялся, см. {log.name}')
+                time.sleep(0.2)
+        health = session.get(base + '/api/health').json()
+
+        def send(method, path, body, headers=None):
+            response = session.request(method, base + path, json=body, headers=headers)
+            return response.status_code, response.content
+
+        results = run_scenarios(send, SCALES[scale], args.duration, args.seed)
+        return {
+            'scenarios': results,
+            'data_load_ms': health.get('boot', {}).get('data_load_ms'),
+            'rss_mb': worker_peak_rss_mb(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+        log.close()
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+# === СРАВНЕНИЕ С БАЗОЙ ===
+def regressions(key, result, baseline, tolerance, slack_ms, p99_slack_ms):
+    """Строки о том, что стало хуже базы; пустой список - всё в пределах"""
+    found = []
+    for name, current in result['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for metric, slack in (('p50_ms', slack_ms), ('p99_ms', p99_slack_ms)):
+            if current[metric] > base[metric] * (1 + tolerance) + slack:
+                found.append(f'{key} {name}: {metric} {current[metric]} > {base[metric]}')
+        base_mean_ms, mean_ms = 1000 / base['rps'], 1000 / current['rps']
+        if mean_ms > base_mean_ms * (1 + tolerance) + slack_ms:
+            found.append(f'{key} {name}: rps {current["rps"]} < {base["rps"]}')
+    if result.get('rss_mb') and baseline.get('rss_mb') and result['rss_mb'] > baseline['rss_mb'] * (1 + tolerance):
+        found.append(f'{key}: rss_mb {result["rss_mb"]} > {baseline["rss_mb"]}')
+    return found
+
+
+def print_result(key, result):
+    print(f'\n📊 {key}: загрузка {result["data_load_ms"]} мс, пиковая RSS {result["rss_mb"]} МБ')
+    print(f'{"сценарий":<18}{"n":>6}{"rps":>10}{"p50, мс":>12}{"p99, мс":>12}')
+    for name, r in result['scenarios'].items():
+        print(f'{name:<18}{r["n"]:>6}{r["rps"]:>10}{r["p50_ms"]:>12}{r["p99_ms"]:>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='1k,100k', help='через запятую: ' + ', '.join(SCALES))
+    parser.add_argument('--backend', default='memory', help='memory, sqlite или оба через запятую')
+    parser.add_argument('--gunicorn', action='store_true', help='ещё и через локальный gunicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--duration', type=float, default=2.0, help='секунд на сценарий')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое ухудшение, доля')
+    parser.add_argument('--slack-ms', type=float, default=1.0, help='допустимый шум p50 и среднего, мс')
+    parser.add_argument('--p99-slack-ms', type=float, default=10.0,
+                        help='допустимый шум p99, мс (хвост чувствителен к соседям и fsync)')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    modes = ['client'] + (['gunicorn'] if args.gunicorn else [])
+    try:
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        baselines = {}
+
+    failed = []
+    for scale in args.scale.split(','):
+        for backend in args.backend.split(','):
+            for mode in modes:
+                key = f'{backend}/{mode}/{scale}'
+                run = run_gunicorn if mode == 'gunicorn' else run_client
+                result = run(scale, backend, args)
+                print_result(key, result)
+                if args.save_baseline:
+                    baselines[key] = result
+                elif key in baselines:
+                    failed += regressions(key, result, baselines[key], args.tolerance, args.slack_ms,
+                                          args.p99_slack_ms)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f'\n💾 База записана в {BASELINE_FILE}')
+    elif failed:
+        print('\n🔴 Хуже базы:\n  ' + '\n  '.join(failed))
+        return 1
+    else:
+        print('\n✅ В пределах базы')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Колоночное зеркало записей для фильтров и статистики (нужен NumPy).
+
+ColumnIndex заменяет FacetIndex в MemoryStore, если установлен NumPy:
+вместо множеств id на каждое значение - по массиву кодов на поле (код -
+номер значения в общей таблице Codes), плюс колонки id, год рождения и
+признак живой строки. Фильтры - логические маски, начальные счётчики
+/api/stats - bincount по колонкам, а не проход по записям. Без NumPy
+хранилище работает как раньше (FacetIndex и StatsIndex по записям).
+
+Строки упорядочены по id, строка ищется через searchsorted. Как и
+FacetIndex, опубликованный индекс не меняется: copy() делит массивы с
+оригиналом, а черновик копирует колонку при первом изменении строки.
+Новые id (они всегда больше прежних) дописываются в хвост за пределами
+size оригинала, поэтому без копирования. Удалённые строки только
+помечаются; когда мёртвых больше, чем живых, copy() их вычищает.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from indexes import FACET_FIELDS, StatsIndex, birth_year
+
+CITY = 'city'  # колонка birth_place: только для статистики
+CODED = FACET_FIELDS + (CITY,)
+NO_VALUE = -1  # нет города или года рождения
+
+
+class Codes:
+    """Значение <-> небольшое целое. Коды только добавляются, поэтому
+    таблица общая для всех копий индекса"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self._codes.get(value)
+
+
+class ColumnIndex:
+    # Порядок колонок - порядок значений в _row_values
+    DTYPES = {'id': 'int64', 'alive': 'bool', 'birth_year': 'int64',
+              'crime_type': 'int32', 'danger_level': 'int32', 'status': 'int32', CITY: 'int32'}
+
+    def __init__(self, records=()):
+        self._codes = {field: Codes() for field in CODED}
+        records = list(records)
+        # По колонке за проход: без кортежа на строку, которые гоняли бы сборщик мусора
+        years = map(birth_year, records)
+        city = self._codes[CITY].code
+        values = {
+            'id': [record.get('id') for record in records],
+            'alive': [True] * len(records),
+            'birth_year': [NO_VALUE if year is None else year for year in years],
+            **{field: list(map(self._codes[field].code, [record.get(field) for record in records]))
+               for field in FACET_FIELDS},
+            CITY: [city(value) if value else NO_VALUE for value in (r.get('birth_place') for r in records)],
+        }
+        columns = {name: numpy.array(values[name], dtype=dtype) for name, dtype in self.DTYPES.items()}
+        ids = columns['id']
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+            order = numpy.argsort(ids, kind='stable')
+            columns = {name: column[order] for name, column in columns.items()}
+        self._columns = columns
+        self.size = len(records)
+        self.dead = 0
+        self._owned = set()
+
+    def _row_values(self, record):
+        """Значения строки в порядке DTYPES"""
+        get = record.get
+        codes = self._codes
+        city = get('birth_place')
+        year = birth_year(record)
+        return (
+            get('id'),
+            True,
+            NO_VALUE if year is None else year,
+            codes['crime_type'].code(get('crime_type')),
+            codes['danger_level'].code(get('danger_level')),
+            codes['status'].code(get('status')),
+            codes[CITY].code(city) if city else NO_VALUE,
+        )
+
+    def copy(self):
+        draft = ColumnIndex.__new__(ColumnIndex)
+        draft._codes = self._codes
+        draft._columns = dict(self._columns)
+        draft.size = self.size
+        draft.dead = self.dead
+        draft._owned = set()
+        if draft.dead > draft.size - draft.dead:
+            draft._compact()
+        return draft
+
+    def _compact(self):
+        live = self._columns['alive'][:self.size]
+        self._columns = {name: column[:self.size][live] for name, column in self._columns.items()}
+        self.size = len(self._columns['id'])
+        self.dead = 0
+        self._owned = set(self._columns)
+
+    def _writable(self, name):
+        if name not in self._owned:
+            self._columns[name] = self._columns[name].copy()
+            self._owned.add(name)
+        return self._columns[name]
+
+    def _find(self, suspect_id):
+        """(строка, есть ли там suspect_id) - позиция, как у searchsorted"""
+        ids = self._columns['id']
+        row = int(numpy.searchsorted(ids[:self.size], suspect_id))
+        return row, row < self.size and ids[row] == suspect_id
+
+    def add(self, record):
+        values = self._row_values(record)
+        row, found = self._find(values[0])
+        if found:
+            # Изменение записи: remove() уже пометил строку мёртвой. Копируем
+            # только колонки, где значение и правда другое
+            for name, value in zip(self.DTYPES, values):
+                if self._columns[name][row] != value:
+                    self._writable(name)[row] = value
+            self.dead -= 1
+        elif row == self.size:
+            self._append(values)
+        else:
+            # id меньше последнего - бывает только при загрузке извне, редкость
+            self._columns = {name: numpy.insert(column[:self.size], row, value)
+                             for (name, column), value in zip(self._columns.items(), values)}
+            self._owned = set(self._columns)
+            self.size += 1
+
+    def _append(self, values):
+        size = self.size
+        if size == len(self._columns['id']):
+            # Места нет - новые массивы вдвое больше; оригинал остаётся со старыми
+            capacity = max(16, 2 * size)
+            for name, dtype in self.DTYPES.items():
+                grown = numpy.zeros(capacity, dtype=dtype)
+                grown[:size] = self._columns[name][:size]
+                self._columns[name] = grown
+            self._owned = set(self._columns)
+        # Хвост за size оригинала никто не читает - пишем без копирования
+        for name, value in zip(self.DTYPES, values):
+            self._columns[name][size] = value
+        self.size = size + 1
+
+    def remove(self, record):
+        row, found = self._find(record['id'])
+        if found:
+            self._writable('alive')[row] = False
+            self.dead += 1
+
+    def _mask(self, filters):
+        """Маска живых строк, где совпадают все пары (поле, значение); None - совпадений нет"""
+        mask = self._columns['alive'][:self.size]
+        for field, value in filters:
+            code = self._codes[field].lookup(value)
+            if code is None:
+                return None
+            mask = mask & (self._columns[field][:self.size] == code)
+        return mask
+
+    def match(self, filters):
+        """Множество id, у которых совпадают все пары (поле, значение)"""
+        return set(self.match_ids(filters))
+
+    def match_ids(self, filters):
+        """То же, что match, но списком по возрастанию id"""
+        mask = self._mask(filters)
+        if mask is None:
+            return []
+        return self._columns['id'][:self.size][mask].tolist()
+
+    def select(self, ids, filters):
+        """Те из ids, у которых совпадают все пары (поле, значение). Кандидатов
+        поиска мало - проверяем их строки, не собирая множество по фильтру"""
+        if not self.size:
+            return []
+        ids = numpy.fromiter(ids, dtype='int64', count=len(ids))
+        column = self._columns['id'][:self.size]
+        rows = numpy.minimum(numpy.searchsorted(column, ids), self.size - 1)
+        mask = (column[rows] == ids) & self._columns['alive'][rows]
+        for field, value in filters:
+            code = self._codes[field].lookup(value)
+            if code is None:
+                return []
+            mask &= self._columns[field][rows] == code
+        return ids[mask].tolist()
+
+    def stats(self):
+        """StatsIndex по живым строкам - bincount по колонкам вместо обхода записей"""
+        live = self._columns['alive'][:self.size]
+        counts = []
+        for field in CODED:
+            codes = self._columns[field][:self.size][live]
+            if field == CITY:
+                codes = codes[codes != NO_VALUE]
+            values = self._codes[field].values
+            per_code = numpy.bincount(codes, minlength=len(values))
+            counts += [(field, values[code], int(per_code[code])) for code in numpy.flatnonzero(per_code)]
+        years = self._columns['birth_year'][:self.size][live]
+        years, per_year = numpy.unique(years[years != NO_VALUE], return_counts=True)
+        counts += [('birth_year', int(year), int(count)) for year, count in zip(years, per_year)]
+        return StatsIndex.from_counts(int(live.sum()), counts)
@@ -0,0 +1,159 @@
+"""WSGI-middleware сжатия JSON-ответов API (gzip, brotli при наличии).
+
+Сжимаются только ответы 200 с текстовым/JSON содержимым, которые не
+меньше min_size. Vary: Accept-Encoding получают все ответы под prefix
+(и 304, и несжатые) - иначе общий кэш отдаст чужой вариант. Потоковые ответы без Content-Length буферизуются лишь
+до порога, а дальше сжимаются кусками с flush, не теряя потоковости.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_set_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain')
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._c = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024, prefix='/api/', gzip_level=6, brotli_level=4):
+        self.app = app
+        self.min_size = min_size
+        self.prefix = prefix
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+
+    def _choose_encoding(self, environ):
+        accept = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and accept['br']:
+            return 'br'
+        if accept['gzip']:
+            return 'gzip'
+        return None
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return _Brotli(self.brotli_level)
+        return _Gzip(self.gzip_level)
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.prefix):
+            return self.app(environ, start_response)
+        encoding = None if environ.get('REQUEST_METHOD') == 'HEAD' else self._choose_encoding(environ)
+        if encoding is None:
+            def start_uncompressed(status, header_list, exc_info=None):
+                headers = Headers(header_list)
+                _add_vary(headers)
+                return start_response(status, headers.to_wsgi_list(), exc_info)
+
+            return self.app(environ, start_uncompressed)
+
+        # Сжатое представление получает ETag с суффиксом; приложение о нём не
+        # знает, поэтому суффикс снимаем с If-None-Match и возвращаем в 304
+        suffix = f'-{encoding}"'
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        client_had_suffix = bool(if_none_match) and suffix in if_none_match
+        if client_had_suffix:
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match.replace(suffix, '"')
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        app_iter = self.app(environ, capture)
+        return self._respond(app_iter, captured, start_response, encoding, suffix, client_had_suffix)
+
+    def _respond(self, app_iter, captured, start_response, encoding, suffix, client_had_suffix):
+        status, header_list, exc_info = captured
+        headers = Headers(header_list)
+        code = int(status.split(' ', 1)[0])
+        _add_vary(headers)
+
+        if code == 304 and client_had_suffix and headers.get('ETag', '').endswith('"'):
+            headers['ETag'] = headers['ETag'][:-1] + suffix
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip()
+        if (code != 200 or 'Content-Encoding' in headers
+                or mimetype not in COMPRESSIBLE_TYPES):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        length = headers.get('Content-Length', type=int)
+        if length is not None and length < self.min_size:
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        # Длина неизвестна (поток) - копим начало до порога
+        iterator = iter(app_iter)
+        head, size = [], 0
+        if length is None:
+            for chunk in iterator:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                _close(app_iter)
+                body = b''.join(head)
+                headers['Content-Length'] = str(len(body))
+                start_response(status, headers.to_wsgi_list(), exc_info)
+                return [body]
+
+        del headers['Content-Length']
+        headers['Content-Encoding'] = encoding
+        etag = headers.get('ETag')
+        if etag and etag.endswith('"') and not etag.startswith('W/'):
+            headers['ETag'] = etag[:-1] + suffix
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return self._compress(app_iter, iterator, head, self._compressor(encoding))
+
+    def _compress(self, app_iter, iterator, head, compressor):
+        try:
+            if head:
+                yield compressor.compress(b''.join(head))
+            for chunk in iterator:
+                if chunk:
+                    yield compressor.compress(chunk)
+            yield compressor.finish()
+        finally:
+            _close(app_iter)
+
+
+def _add_vary(headers):
+    vary = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in parse_set_header(vary.lower()):
+        headers['Vary'] = f'{vary}, Accept-Encoding'
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
@@ -0,0 +1,16 @@
+"""Кодирование JSON в байты для готовых фрагментов ответа.
+
+Стандартный json с теми же настройками, что у jsonify (компактно, ключи
+по алфавиту, ensure_ascii), - фрагменты совпадают с его выводом байт в
+байт. orjson здесь не подходит: он пишет UTF-8 как есть, числа с
+плавающей точкой и NaN - по-своему, а целые шире 64 бит не кодирует
+вовсе. Перекодирование его вывода в \\uXXXX с такими проверками на
+кириллических записях обходится дороже стандартного C-кодировщика.
+"""
+import json
+
+_encoder = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+
+def dumps(obj):
+    return _encoder.encode(obj).encode('ascii')
@@ -0,0 +1,42 @@
+"""Настройки gunicorn: подхватываются автоматически при `gunicorn app:app`.
+
+gthread - чтобы долгие SSE-соединения не занимали весь воркер.
+"""
+import os
+import subprocess
+import sys
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+
+def worker_count(environ):
+    """WEB_CONCURRENCY, но для бэкенда в памяти - всегда 1: у каждого воркера
+    был бы свой next_id, а журнал в DATA_DIR они писали бы вперемешку"""
+    workers = int(environ.get('WEB_CONCURRENCY', 1))
+    if workers > 1 and environ.get('STORAGE_BACKEND', 'memory') != 'sqlite':
+        print(f"⚠️ WEB_CONCURRENCY={workers} без STORAGE_BACKEND=sqlite - запускаем 1 воркер",
+              file=sys.stderr)
+        return 1
+    return workers
+
+
+workers = worker_count(os.environ)
+
+_keep_warm = None
+
+
+def when_ready(server):
+    # Мастер один на развёртывание - анти-сон запускается ровно раз, сколько бы
+    # ни было воркеров. Именно процессом: поток мастера, застигнутый fork'ом
+    # посреди import или запроса, оставил бы воркеру захваченные блокировки.
+    global _keep_warm
+    import keepwarm
+
+    if keepwarm.enabled():
+        _keep_warm = subprocess.Popen([sys.executable, '-m', 'keepwarm'])
+
+
+def on_exit(server):
+    if _keep_warm is not None:
+        _keep_warm.terminate()
@@ -0,0 +1,307 @@
+"""Вторичные индексы хранилища подозреваемых."""
+from array import array
+from datetime import date
+
+from records import Suspect
+
+# Поля, по которым работает полнотекстовый поиск (q=)
+TEXT_FIELDS = ('full_name', 'crime_details', 'birth_place')
+# Поля-фильтры с небольшим числом различных значений
+FACET_FIELDS = ('crime_type', 'danger_level', 'status')
+GRAM = 3
+CHUNK_BITS = 10  # по 1024 соседних id в куске (FacetIndex, store.RecordMap)
+
+
+def searchable_texts(record):
+    """Строки записи в нижнем регистре, по которым ищет q="""
+    texts = [(record.get(field) or '').lower() for field in TEXT_FIELDS]
+    texts.extend(alias.lower() for alias in record.get('alias') or ())
+    return tuple(texts)
+
+
+def trigrams(texts):
+    return {text[i:i + GRAM] for text in texts for i in range(len(text) - GRAM + 1)}
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм для поиска подстроки.
+
+    Списки вхождений - массивы id, в которые только дописывают: удалённые
+    и изменённые записи оставляют устаревшие вхождения, а кандидаты всегда
+    перепроверяются точным `query in text` по записям снапшота. Поэтому
+    снапшот, взявший ссылку на postings раньше, видит надмножество нужных
+    кандидатов и может читать их без блокировок, пока писатель дописывает.
+    Когда мусора становится больше, чем живых вхождений, писатель строит
+    новый индекс, а старые снапшоты остаются со старыми postings.
+    """
+
+    def __init__(self, items=()):
+        self.postings = {}     # триграмма -> array('q') с id
+        self._live = 0
+        self._stale = 0
+        for suspect_id, texts in items:
+            self.add(suspect_id, texts)
+
+    def add(self, suspect_id, texts):
+        postings = self.postings
+        grams = trigrams(texts)
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = ids = array('q')
+            ids.append(suspect_id)
+        self._live += len(grams)
+
+    def remove(self, texts):
+        dead = len(trigrams(texts))
+        self._live -= dead
+        self._stale += dead
+
+    @property
+    def needs_rebuild(self):
+        return self._stale > self._live
+
+
+def trigram_candidates(postings, query):
+    """Надмножество id, где может встречаться query (len(query) >= GRAM)"""
+    lists = []
+    for gram in trigrams((query,)):
+        ids = postings.get(gram)
+        if ids is None:
+            return set()
+        lists.append(ids)
+    lists.sort(key=len)
+
+    candidates = set(lists[0])
+    for ids in lists[1:]:
+        # Пересекать с длинным списком дороже, чем проверить кандидатов
+        if not candidates or len(ids) > 16 * len(candidates):
+            break
+        candidates.intersection_update(ids)
+    return candidates
+
+
+class FacetIndex:
+    """Множества id по значению для каждого поля-фильтра, разложенные по
+    кускам соседних id (как записи в store.RecordMap).
+
+    Опубликованный индекс не меняется: писатель работает с copy(), который
+    делит куски с оригиналом и копирует каждый лишь при первом изменении -
+    запись не копирует множество из трети всех id ради одного id.
+    """
+
+    def __init__(self, records=()):
+        self._postings = {field: {} for field in FACET_FIELDS}  # поле -> значение -> кусок -> set
+        self._owned = set()
+        for record in records:
+            suspect_id = record['id']
+            key = suspect_id >> CHUNK_BITS
+            for field in FACET_FIELDS:
+                chunks = self._postings[field].setdefault(record.get(field), {})
+                chunks.setdefault(key, set()).add(suspect_id)
+
+    def copy(self):
+        draft = FacetIndex.__new__(FacetIndex)
+        draft._postings = {field: dict(by_value) for field, by_value in self._postings.items()}
+        draft._owned = set()
+        return draft
+
+    def _chunk_for_write(self, field, value, key):
+        """Куски множества (field, value) и кусок key в них - свои у черновика"""
+        by_value = self._postings[field]
+        if (field, value) not in self._owned:
+            by_value[value] = dict(by_value.get(value) or ())
+            self._owned.add((field, value))
+        chunks = by_value[value]
+        if (field, value, key) not in self._owned:
+            chunks[key] = set(chunks.get(key) or ())
+            self._owned.add((field, value, key))
+        return chunks
+
+    def add(self, record):
+        suspect_id = record['id']
+        key = suspect_id >> CHUNK_BITS
+        for field in FACET_FIELDS:
+            self._chunk_for_write(field, record.get(field), key)[key].add(suspect_id)
+
+    def remove(self, record):
+        suspect_id = record['id']
+        key = suspect_id >> CHUNK_BITS
+        for field in FACET_FIELDS:
+            value = record.get(field)
+            chunks = self._chunk_for_write(field, value, key)
+            chunks[key].discard(suspect_id)
+            if not chunks[key]:
+                del chunks[key]
+                self._owned.discard((field, value, key))
+            if not chunks:
+                del self._postings[field][value]
+                self._owned.discard((field, value))
+
+    def match(self, filters):
+        """Множество id, у которых совпадают все пары (поле, значение)"""
+        lists = []
+        for field, value in filters:
+            chunks = self._postings[field].get(value)
+            if not chunks:
+                return set()
+            lists.append(chunks)
+        lists.sort(key=len)
+        result = set()
+        for key, ids in lists[0].items():
+            for chunks in lists[1:]:
+                other = chunks.get(key)
+                if other is None:
+                    break
+                ids = ids & other
+            else:
+                result |= ids
+        return result
+
+    def match_ids(self, filters):
+        """То же, что match, но списком по возрастанию id"""
+        return sorted(self.match(filters))
+
+    def select(self, ids, filters):
+        """Те из ids, у которых совпадают все пары (поле, значение)"""
+        return self.match(filters).intersection(ids)
+
+
+AGE_GROUPS = ('до 18', '18-25', '26-35', '36+')
+
+
+def birth_year(record):
+    """Год рождения из date_of_birth, None если даты нет или она кривая"""
+    if isinstance(record, Suspect):
+        # Компактная запись хранит дату ординалом - строку не собираем и не разбираем
+        ordinal = record.date_ordinal('date_of_birth')
+        if ordinal is not None:
+            return date.fromordinal(ordinal).year
+    date_of_birth = record.get('date_of_birth')
+    if not date_of_birth:
+        return None
+    try:
+        return int(date_of_birth.split('-')[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def age_group(age):
+    if age < 18:
+        return 'до 18'
+    if age < 26:
+        return '18-25'
+    if age < 36:
+        return '26-35'
+    return '36+'
+
+
+def stat_keys(record):
+    """Пары (счётчик, ключ), в которые запись вносит единицу"""
+    keys = [
+        ('crime_type', record.get('crime_type')),
+        ('danger_level', record.get('danger_level')),
+        ('status', record.get('status')),
+    ]
+    if record.get('birth_place'):
+        keys.append(('city', record['birth_place']))
+    year = birth_year(record)
+    if year is not None:
+        keys.append(('birth_year', year))
+    return keys
+
+
+def _bump(counter, key, delta):
+    count = counter.get(key, 0) + delta
+    if count:
+        counter[key] = count
+    else:
+        del counter[key]
+
+
+class StatsIndex:
+    """Счётчики для /api/stats, обновляемые при каждой мутации.
+
+    Возрастные группы зависят от текущего года, поэтому хранится
+    распределение по годам рождения, а группы пересчитываются из него
+    только при смене календарного года. Как и FacetIndex, опубликованный
+    экземпляр не меняется - писатель работает с copy().
+    """
+
+    def __init__(self, records=()):
+        self.total = 0
+        self.by_crime_type = {}
+        self.by_danger_level = {}
+        self.by_status = {}
+        self.by_city = {}
+        self._birth_years = {}
+        self._age_cache = None  # (год, группы) - одной ссылкой, чтобы читать без блокировок
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_counts(cls, total, counts):
+        """Собирает индекс из готовых (счётчик, ключ, число) - например, из БД"""
+        stats = cls()
+        stats.total = total
+        counters = stats._counters()
+        for kind, key, count in counts:
+            counters[kind][key] = count
+        return stats
+
+    def _counters(self):
+        return {
+            'crime_type': self.by_crime_type,
+            'danger_level': self.by_danger_level,
+            'status': self.by_status,
+            'city': self.by_city,
+            'birth_year': self._birth_years,
+        }
+
+    def copy(self):
+        draft = StatsIndex()
+        draft.total = self.total
+        draft.by_crime_type = dict(self.by_crime_type)
+        draft.by_danger_level = dict(self.by_danger_level)
+        draft.by_status = dict(self.by_status)
+        draft.by_city = dict(self.by_city)
+        draft._birth_years = dict(self._birth_years)
+        if self._age_cache is not None:
+            draft._age_cache = (self._age_cache[0], dict(self._age_cache[1]))
+        return draft
+
+    def add(self, record):
+        self._apply(record, 1)
+
+    def remove(self, record):
+        """Вычитает запись по её текущим (ещё не изменённым) значениям"""
+        self._apply(record, -1)
+
+    def _apply(self, record, delta):
+        self.total += delta
+        counters = self._counters()
+        for kind, key in stat_keys(record):
+            _bump(counters[kind], key, delta)
+            if kind == 'birth_year' and self._age_cache is not None:
+                cached_year, groups = self._age_cache
+                groups[age_group(cached_year - key)] += delta
+
+    def age_groups(self, current_year):
+        cache = self._age_cache
+        if cache is None or cache[0] != current_year:
+            groups = dict.fromkeys(AGE_GROUPS, 0)
+            for year, count in self._birth_years.items():
+                groups[age_group(current_year - year)] += count
+            self._age_cache = cache = (current_year, groups)
+        return dict(cache[1])
+
+    def snapshot(self, current_year):
+        """Статистика в формате ответа /api/stats"""
+        return {
+            'total': self.total,
+            'by_crime_type': dict(self.by_crime_type),
+            'by_danger_level': dict(self.by_danger_level),
+            'by_status': dict(self.by_status),
+            'by_city': dict(self.by_city),
+            'by_age_group': self.age_groups(current_year),
+        }
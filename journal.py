@@ -0,0 +1,278 @@
+"""Журнал изменений базы подозреваемых.
+
+Каждая мутация дописывается строкой JSON в journal.jsonl, периодически
+журнал сворачивается в snapshot.json. При старте читается снапшот и
+поверх него проигрывается хвост журнала. Там же хранится эпоха данных:
+пока каталог цел, она не меняется.
+
+Сворачивание идёт в два шага: begin_compaction() под блокировкой
+писателя откладывает журнал в journal.old.jsonl и начинает новый, а
+finish_compaction() пишет снапшот уже без блокировки (хранилище делает
+это в фоновом потоке) и удаляет отложенный журнал.
+
+Обычная запись (ровно поля records.FIELDS) лежит в снапшоте списком
+значений в порядке fields, остальные - словарями: списки разбираются
+вдвое быстрее словарей на 16 ключей, а это основная цена старта.
+
+Писать в каталог может только один процесс: Journal берёт на него
+исключительную блокировку (flock на файле .lock) и не открывается, если
+она уже занята - иначе два процесса выдавали бы одни и те же id, а
+сворачивание одного теряло бы записи другого.
+"""
+import gc
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: каталог не блокируется
+    fcntl = None
+
+from records import FIELDS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'snapshot.json'
+JOURNAL_FILE = 'journal.jsonl'
+OLD_JOURNAL_FILE = 'journal.old.jsonl'  # журнал, который сейчас сворачивается
+LOCK_FILE = '.lock'
+SNAPSHOT_BATCH = 1000  # записей на один вызов json.dumps при записи снапшота
+
+
+class Journal:
+    """Append-only журнал + снапшот в каталоге data_dir.
+
+    Операции журнала идемпотентны (put пишет запись целиком, del удаляет
+    по id), поэтому падение между записью снапшота и обрезкой журнала
+    безопасно: повторное проигрывание даёт то же состояние. Если процесс
+    упал посреди фонового сворачивания, при старте отложенный журнал
+    склеивается с новым и сворачивание просто повторится позже.
+    """
+
+    def __init__(self, data_dir, compact_every=1000, fsync=True):
+        self.data_dir = data_dir
+        self.snapshot_path = os.path.join(data_dir, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(data_dir, JOURNAL_FILE)
+        self.old_journal_path = os.path.join(data_dir, OLD_JOURNAL_FILE)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.entries = 0
+        self.epoch = None  # из снапшота или журнала; None - ещё не записана
+        self._file = None
+        self._compacting = False
+        self._lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+        self._lock_file = self._lock_directory()
+
+    def _lock_directory(self):
+        if fcntl is None:
+            return None
+        lock_file = open(os.path.join(self.data_dir, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f"Каталог данных {self.data_dir} занят другим процессом") from None
+        return lock_file
+
+    def close(self):
+        """Закрывает журнал и снимает блокировку каталога"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # === ЧТЕНИЕ ===
+    def load(self, seed_records, seed_next_id):
+        """Восстанавливает (records, next_id, version) из снапшота и журнала.
+
+        Если снапшота нет, базой служат seed_records.
+        """
+        # Сотни тысяч мелких объектов подряд - сборщик мусора тут только мешает
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load(seed_records, seed_next_id)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _load(self, seed_records, seed_next_id):
+        records = {r['id']: r for r in seed_records}
+        next_id = seed_next_id
+        version = 0
+
+        # 100k записей (снапшот ~40 МБ) на одном ядре: разбор JSON ~0.4 с,
+        # словари из строк ~0.25 с, вместе со сборкой хранилища 0.85-0.95 с.
+        # orjson выигрывает на разборе ~0.05 с - не стоит зависимости
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = json.load(f)
+            fields = snapshot.get('fields')
+            records = {r['id']: r for r in (
+                dict(zip(fields, r)) if type(r) is list else r for r in snapshot['records'])}
+            next_id = snapshot['next_id']
+            version = snapshot.get('version', 0)
+            self.epoch = snapshot.get('epoch')
+
+        if os.path.exists(self.old_journal_path):
+            self._merge_old_journal()
+        for entry in self._read_entries():
+            if entry['op'] == 'put':
+                record = entry['data']
+                records[record['id']] = record
+                next_id = max(next_id, record['id'] + 1)
+            elif entry['op'] == 'del':
+                records.pop(entry['id'], None)
+            elif entry['op'] == 'epoch':
+                self.epoch = entry['epoch']
+            version = max(version, entry.get('v', 0))
+            self.entries += 1
+
+        logger.info(f"💾 Восстановлено {len(records)} записей "
+                    f"(журнал: {self.entries} операций)")
+        return list(records.values()), next_id, version
+
+    def _read_entries(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, 'rb') as f:
+            raw = f.read()
+        lines = [line for line in raw.split(b'\n') if line.strip()]
+        if not lines:
+            return []
+        if raw.endswith(b'\n'):
+            try:
+                # Один вызов парсера на весь хвост заметно быстрее построчного
+                return json.loads(b'[' + b','.join(lines) + b']')
+            except ValueError:
+                pass
+
+        entries = []
+        end = 0
+        for line in raw.split(b'\n'):
+            start, end = end, end + len(line) + 1
+            if not line.strip():
+                continue
+            try:
+                if end > len(raw):
+                    raise ValueError('нет перевода строки')  # запись не дописана
+                entries.append(json.loads(line))
+            except ValueError:
+                # Оборванная последняя строка после падения - отбрасываем и
+                # обрезаем файл, иначе следующая запись приклеится к ней
+                if raw[end:].strip():
+                    raise
+                logger.warning("⚠️ Журнал: отброшена неполная последняя запись")
+                self._truncate(start)
+                break
+        return entries
+
+    def _merge_old_journal(self):
+        """Сворачивание не успело дописать снапшот: отложенный журнал и
+        новый склеиваются обратно в один (атомарно, через временный файл)"""
+        logger.warning("⚠️ Журнал: сворачивание не завершено, журналы склеены обратно")
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            for path in (self.old_journal_path, self.journal_path):
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        out.write(f.read())
+            out.flush()
+            if self.fsync:
+                os.fsync(out.fileno())
+        os.replace(tmp_path, self.journal_path)
+        os.remove(self.old_journal_path)
+
+    def _truncate(self, size):
+        with open(self.journal_path, 'r+b') as f:
+            f.truncate(size)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    # === ЗАПИСЬ ===
+    def record_epoch(self, epoch):
+        """Запоминает эпоху новых данных (до ближайшего снапшота - в журнале)"""
+        self.epoch = epoch
+        self._append([{'op': 'epoch', 'epoch': epoch}])
+
+    def append_batch(self, ops):
+        """Операции транзакции (op, запись или id, версия) - одной записью
+        и одним fsync"""
+        self._append([
+            {'op': 'put', 'data': payload, 'v': version} if op == 'put'
+            else {'op': 'del', 'id': payload, 'v': version}
+            for op, payload, version in ops
+        ])
+
+    def _append(self, entries):
+        data = b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+                        for entry in entries)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, 'ab')
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.entries += len(entries)
+
+    def should_compact(self):
+        return self.entries >= self.compact_every
+
+    def compact(self, records, next_id, version):
+        """Сворачивает журнал сразу: records должны отражать все записанные
+        в него операции."""
+        if self.begin_compaction():
+            self.finish_compaction(records, next_id, version)
+
+    def begin_compaction(self):
+        """Откладывает текущий журнал и начинает новый. Вызывается, пока
+        записи не идут (под блокировкой писателя хранилища); False, если
+        предыдущее сворачивание ещё не закончено."""
+        with self._lock:
+            if self._compacting:
+                return False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.old_journal_path)
+            self.entries = 0
+            self._compacting = True
+            return True
+
+    def finish_compaction(self, records, next_id, version):
+        """Пишет снапшот атомарно (через временный файл) и удаляет
+        отложенный журнал. records - состояние ровно на момент
+        begin_compaction(); новые записи тем временем идут в новый журнал.
+
+        Записи кодируются пачками: json.dumps не отпускает GIL, и один
+        вызов на весь снапшот останавливал бы обработку запросов на
+        сотни миллисекунд."""
+        fields = set(FIELDS)
+        records = [[r[field] for field in FIELDS] if r.keys() == fields else r for r in records]
+        head = json.dumps({'next_id': next_id, 'version': version, 'epoch': self.epoch,
+                           'fields': FIELDS}, ensure_ascii=False)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(head[:-1].encode('utf-8') + b', "records": [')
+            for start in range(0, len(records), SNAPSHOT_BATCH):
+                batch = json.dumps(records[start:start + SNAPSHOT_BATCH], ensure_ascii=False)
+                f.write((', ' if start else '').encode('ascii') + batch[1:-1].encode('utf-8'))
+            f.write(b']}')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.old_journal_path):
+            os.remove(self.old_journal_path)
+        with self._lock:
+            self._compacting = False
+        logger.info(f"💾 Журнал свёрнут в снапшот ({len(records)} записей)")
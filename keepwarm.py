@@ -0,0 +1,155 @@
+"""Поддержание сервиса «тёплым» на бесплатном плане Render.
+
+Запускается один раз на развёртывание: под gunicorn - отдельным процессом
+`python -m keepwarm` из хука when_ready (gunicorn.conf.py), при
+`python app.py` - потоком из __main__. Раз в interval ± jitter проверяет один
+лёгкий эндпоинт через постоянную сессию requests и записывает задержку:
+долгий ответ означает, что сервис успел уснуть и проснулся от проверки.
+Сводка пишется в state_file, откуда её показывает /api/health.
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.environ.get('KEEPWARM_STATE', os.path.join(tempfile.gettempdir(), 'keepwarm.json'))
+COLD_THRESHOLD = 5.0  # секунд: ответ дольше похож на холодный старт
+
+
+class KeepWarm:
+    def __init__(self, base_url, interval=300, jitter=0.2, path='/api/ping', timeout=60,
+                 state_file=STATE_FILE, history=50):
+        self.url = base_url.rstrip('/') + path
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.state_file = state_file
+        self.history = deque(maxlen=history)
+        self.probes = 0
+        self.failures = 0
+        self.cold_starts = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='keep-warm', daemon=True)
+            self._thread.start()
+            logger.info(f"🛡️ Защита от сна запущена: {self.url}, "
+                        f"интервал {self.interval} с ± {int(self.jitter * 100)}%")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _delay(self):
+        # Разброс, чтобы проверки разных сервисов не шли в такт
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def run(self):
+        """Цикл проверок в текущем потоке, до stop()"""
+        import requests
+
+        session = requests.Session()
+        session.headers['User-Agent'] = 'Render-KeepWarm/2.0'
+        while not self._stop.wait(self._delay()):
+            self.probe(session)
+
+    def probe(self, session):
+        """Одна проверка: задержка и статус попадают в историю и state_file"""
+        import requests
+
+        started = time.monotonic()
+        try:
+            status = session.get(self.url, timeout=self.timeout).status_code
+            error = None
+        except requests.exceptions.RequestException as e:
+            status, error = None, type(e).__name__
+        latency = time.monotonic() - started
+
+        self.probes += 1
+        cold = latency >= COLD_THRESHOLD
+        if status != 200:
+            self.failures += 1
+            logger.warning(f"🔴 Анти-сон: {error or status} за {latency:.1f} с")
+        elif cold:
+            self.cold_starts += 1
+            logger.warning(f"🥶 Анти-сон: сервис просыпался, ответ за {latency:.1f} с")
+        else:
+            logger.info(f"✅ Анти-сон: {status} за {latency * 1000:.0f} мс")
+        self.history.append({
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'status': status,
+            'latency_ms': round(latency * 1000, 1),
+            'cold': cold,
+        })
+        self._save()
+
+    def summary(self):
+        latencies = sorted(p['latency_ms'] for p in self.history if p['status'] == 200)
+        return {
+            'url': self.url,
+            'interval': self.interval,
+            'probes': self.probes,
+            'failures': self.failures,
+            'cold_starts': self.cold_starts,
+            'median_latency_ms': latencies[len(latencies) // 2] if latencies else None,
+            'max_latency_ms': latencies[-1] if latencies else None,
+            'last': self.history[-1] if self.history else None,
+        }
+
+    def _save(self):
+        tmp = f"{self.state_file}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.summary(), f, ensure_ascii=False)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            logger.warning(f"⚠️ Анти-сон: не удалось сохранить сводку: {e}")
+
+
+def enabled():
+    return bool(os.environ.get('RENDER') and os.environ.get('RENDER_EXTERNAL_URL'))
+
+
+def from_env():
+    """KeepWarm по переменным окружения Render; None, если он не нужен"""
+    if not enabled():
+        logger.info("Анти-сон: режим разработки, пинг не требуется")
+        return None
+    return KeepWarm(
+        os.environ['RENDER_EXTERNAL_URL'],
+        interval=int(os.environ.get('KEEPWARM_INTERVAL', 300)),
+        jitter=float(os.environ.get('KEEPWARM_JITTER', 0.2)),
+        path=os.environ.get('KEEPWARM_PATH', '/api/ping'),
+    )
+
+
+def start_from_env():
+    """Запускает проверки фоновым потоком (для `python app.py`)"""
+    keep_warm = from_env()
+    return keep_warm.start() if keep_warm else None
+
+
+def read_state(state_file=STATE_FILE):
+    """Последняя сводка из state_file, None если проверок ещё не было"""
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    keep_warm = from_env()
+    if keep_warm:
+        logger.info(f"🛡️ Защита от сна запущена: {keep_warm.url}, интервал {keep_warm.interval} с")
+        keep_warm.run()
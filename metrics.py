@@ -0,0 +1,129 @@
+"""Метрики процесса в текстовом формате Prometheus (для /api/metrics).
+
+Запросы считает AccessLogMiddleware через observe_request: число по
+маршруту, методу и классу статуса, гистограммы задержки и размера ответа.
+Время операций хранилища (поиск, статистика) меряет timed(), текущие
+значения (число записей, версия и т.п.) снимаются при выдаче через gauge().
+Всё хранится в памяти процесса: при нескольких воркерах у каждого свои.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последний - выше всех границ
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statuses = {}   # (маршрут, метод, класс статуса) -> число
+        self._latency = {}    # (маршрут, метод) -> Histogram
+        self._sizes = {}      # (маршрут, метод) -> Histogram
+        self._operations = {}  # операция хранилища -> Histogram
+        self._gauges = []     # (имя, тип, описание, collect)
+
+    def observe_request(self, route, method, status, seconds, size):
+        key = (route or 'unmatched', method)
+        status_key = key + (f'{status // 100}xx',)
+        with self._lock:
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+            latency = self._latency.get(key)
+            if latency is None:
+                latency = self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._sizes[key] = Histogram(SIZE_BUCKETS)
+            latency.observe(seconds)
+            self._sizes[key].observe(size)
+
+    @contextmanager
+    def timed(self, operation):
+        """Время блока попадает в suspects_store_operation_seconds{op=...}"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                histogram = self._operations.get(operation)
+                if histogram is None:
+                    histogram = self._operations[operation] = Histogram(LATENCY_BUCKETS)
+                histogram.observe(elapsed)
+
+    def gauge(self, name, help_text, collect, kind='gauge'):
+        """collect() -> число или список (словарь меток, число); вызывается при выдаче"""
+        self._gauges.append((name, kind, help_text, collect))
+
+    def render(self):
+        with self._lock:
+            statuses = sorted(self._statuses.items())
+            latency = sorted((key, _copy(h)) for key, h in self._latency.items())
+            sizes = sorted((key, _copy(h)) for key, h in self._sizes.items())
+            operations = sorted((key, _copy(h)) for key, h in self._operations.items())
+
+        out = [
+            '# HELP http_requests_total Запросы по маршруту, методу и классу статуса.',
+            '# TYPE http_requests_total counter',
+        ]
+        out += [f'http_requests_total{{{_labels(route=r, method=m, status=s)}}} {n}'
+                for (r, m, s), n in statuses]
+        out += ['# HELP http_request_duration_seconds Время от входа в приложение до отдачи тела.',
+                '# TYPE http_request_duration_seconds histogram']
+        for (route, method), histogram in latency:
+            out += histogram.lines('http_request_duration_seconds', _labels(route=route, method=method))
+        out += ['# HELP http_response_size_bytes Размер отданного тела (после сжатия).',
+                '# TYPE http_response_size_bytes histogram']
+        for (route, method), histogram in sizes:
+            out += histogram.lines('http_response_size_bytes', _labels(route=route, method=method))
+        out += ['# HELP suspects_store_operation_seconds Время операций хранилища.',
+                '# TYPE suspects_store_operation_seconds histogram']
+        for operation, histogram in operations:
+            out += histogram.lines('suspects_store_operation_seconds', _labels(op=operation))
+
+        for name, kind, help_text, collect in self._gauges:
+            out += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            value = collect()
+            if isinstance(value, list):
+                out += [f'{name}{{{_labels(**labels)}}} {v}' for labels, v in value]
+            elif value is not None:
+                out.append(f'{name} {value}')
+        return '\n'.join(out) + '\n'
+
+
+def _copy(histogram):
+    copy = Histogram(histogram.bounds)
+    copy.counts = list(histogram.counts)
+    copy.total = histogram.total
+    copy.count = histogram.count
+    return copy
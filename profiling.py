@@ -0,0 +1,140 @@
+"""Профилирование отдельных запросов (включается PROFILE_ENABLED=1).
+
+Запрос профилируется, если пришёл с заголовком X-Profile или выпал по
+sample_rate. Профиль cProfile пишется в profile_dir, где хранятся только
+последние keep файлов. Потоковые ответы не буферизуются: профилировщик
+включается на время выработки каждого куска. top_functions() сводит
+последние профили в таблицу функций по накопленному времени.
+"""
+import cProfile
+import itertools
+import os
+import pstats
+import random
+import re
+import time
+
+from accesslog import ROUTE_KEY
+
+PROFILE_SUFFIX = '.prof'
+# Номер профиля в процессе: в одну секунду на одном маршруте их бывает несколько
+_sequence = itertools.count(1)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profile_dir, sample_rate=0.0, token=None, keep=200):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.token = token  # если задан, X-Profile должен ему равняться
+        self.keep = keep
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def _wanted(self, environ):
+        header = environ.get('HTTP_X_PROFILE')
+        if header is not None:
+            return self.token is None or header == self.token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ):
+            return self.app(environ, start_response)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            app_iter = self.app(environ, start_response)
+        finally:
+            profile.disable()
+        return _ProfiledIterable(app_iter, profile, lambda: self._save(profile, environ, started))
+
+    def _save(self, profile, environ, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        route = re.sub(r'[^A-Za-z0-9]+', '_', environ.get(ROUTE_KEY) or 'unmatched').strip('_')
+        name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}"
+                f"-{environ.get('REQUEST_METHOD')}-{route}-{elapsed_ms:.0f}ms{PROFILE_SUFFIX}")
+        profile.dump_stats(os.path.join(self.profile_dir, name))
+        self._rotate()
+
+    def _rotate(self):
+        files = list_profiles(self.profile_dir)
+        for path in files[:-self.keep]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # уже удалил соседний воркер
+
+
+class _ProfiledIterable:
+    """Профилирует выработку каждого куска тела; профиль сохраняется на close()"""
+
+    def __init__(self, app_iter, profile, on_close):
+        self._app_iter = app_iter
+        self._profile = profile
+        self._on_close = on_close
+
+    def __iter__(self):
+        iterator = iter(self._app_iter)
+        while True:
+            self._profile.enable()
+            try:
+                chunk = next(iterator, None)
+            finally:
+                self._profile.disable()
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self._app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._on_close()
+
+
+def list_profiles(profile_dir):
+    """Файлы профилей от старых к новым"""
+    profiles = []
+    try:
+        with os.scandir(profile_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(PROFILE_SUFFIX):
+                    try:
+                        profiles.append((entry.stat().st_mtime_ns, entry.path))
+                    except OSError:
+                        continue  # удалён между listdir и stat
+    except OSError:
+        return []
+    return [path for _, path in sorted(profiles)]
+
+
+def top_functions(profile_dir, last=50, route=None, limit=30):
+    """(число профилей, функции по убыванию накопленного времени) по last
+    последним профилям; route - подстрока имени файла (например, api_search)"""
+    files = [p for p in list_profiles(profile_dir) if route is None or route in os.path.basename(p)]
+    files = files[-last:]
+    stats = None
+    for path in files:
+        try:
+            if stats is None:
+                stats = pstats.Stats(path)
+            else:
+                stats.add(path)
+        except (OSError, EOFError, TypeError, ValueError):
+            continue  # файл ещё пишется или уже удалён
+    if stats is None:
+        return 0, []
+
+    rows = []
+    for (filename, line, function), (primitive, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({function})',
+            'calls': calls,
+            'primitive_calls': primitive,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+        })
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return len(files), rows[:limit]
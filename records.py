@@ -0,0 +1,226 @@
+"""Компактное представление записи для хранилища в памяти.
+
+Словарь на 16 ключей весит в разы больше самих данных, а значения вроде
+crime_type или status у каждой загруженной из JSON записи - отдельные
+строки. Suspect хранит поля в __slots__, категориальные строки
+интернированы (одно значение - один объект на весь процесс), даты
+хранятся ординалами date.toordinal(), тоже общими. Снаружи это Mapping:
+get, [], keys, ** работают как со словарём, а to_dict() восстанавливает
+исходный словарь ключ в ключ, так что JSON записи не меняется ни на байт.
+Как и словари записей раньше, Suspect после создания не меняют.
+
+Обычная запись (ровно эти 16 полей, даты в виде YYYY-MM-DD или null,
+alias - список) собирается compact() без цикла по полям - это основная
+цена загрузки. Всё, что в схему не ложится (лишние или отсутствующие
+ключи, дата в другом виде), хранится как есть в _extra.
+"""
+from collections.abc import Mapping
+from datetime import date
+
+FIELDS = (
+    'id', 'full_name', 'alias', 'date_of_birth', 'birth_place', 'nationality',
+    'crime_type', 'crime_details', 'status', 'last_seen', 'last_seen_location',
+    'danger_level', 'added_date', 'case_number', 'investigator', 'notes',
+)
+# Немного различных значений на все записи - интернируем
+CATEGORICAL_FIELDS = ('birth_place', 'nationality', 'crime_type', 'status', 'danger_level', 'investigator')
+DATE_FIELDS = ('date_of_birth', 'last_seen', 'added_date')
+
+_MISSING = object()  # ключа нет в записи (или его значение лежит в _extra)
+_strings = {}        # интернированные категориальные значения (только str)
+_ordinals = {}       # 'YYYY-MM-DD' -> ординал (общий int на все записи)
+_dates = {}          # ординал -> 'YYYY-MM-DD'
+
+
+class _Irregular(Exception):
+    """Запись не подходит для быстрого пути compact()"""
+
+
+def _intern(value):
+    if type(value) is not str:
+        return value
+    return _strings.setdefault(value, value)
+
+
+def _date_slot(value):
+    """Ординал строки даты; None для None. _Irregular, если строка не
+    восстановится из ординала той же самой"""
+    if value is None:
+        return None
+    ordinal = _ordinals.get(value) if type(value) is str else None
+    if ordinal is not None:
+        return ordinal
+    try:
+        parsed = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise _Irregular from None
+    # fromisoformat понимает и 20050128, и 2005-W04-5 - берём только YYYY-MM-DD
+    if parsed.isoformat() != value:
+        raise _Irregular
+    ordinal = _ordinals.setdefault(value, parsed.toordinal())
+    _dates.setdefault(ordinal, value)
+    return ordinal
+
+
+def _expand(kind, value):
+    """Значение поля в исходном виде по значению слота"""
+    if value is None or kind is None or kind is str:
+        return value
+    if kind is date:
+        return _dates[value]
+    return list(value) if type(value) is tuple else value
+
+
+class Suspect(Mapping):
+    __slots__ = FIELDS + ('_extra',)
+
+    def __init__(self, record):
+        """Общий путь: любые ключи и значения. _extra здесь всегда словарь
+        (пусть и пустой) - None в нём означает запись из быстрого пути"""
+        extra = {}
+        for field, kind in _KINDS.items():
+            value = record.get(field, _MISSING)
+            if value is _MISSING or value is None or kind is None:
+                pass
+            elif kind is str:
+                value = _intern(value)
+            elif kind is date:
+                try:
+                    value = _date_slot(value)
+                except _Irregular:
+                    extra[field], value = value, _MISSING
+            elif type(value) is list:
+                value = tuple(value)  # кортеж в слоте alias - всегда список в записи
+            elif type(value) is tuple:
+                extra[field], value = value, _MISSING
+            setattr(self, field, value)
+        extra.update((key, value) for key, value in record.items() if key not in _KINDS)
+        self._extra = extra
+
+    def get(self, key, default=None):
+        kind = _KINDS.get(key, _MISSING)
+        if kind is not _MISSING:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                # Категории и обычные поля лежат как есть - без лишнего вызова
+                return value if kind is None or kind is str else _expand(kind, value)
+        if self._extra:
+            return self._extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for field in FIELDS:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self._extra:
+            for key in self._extra:
+                if key not in _KINDS or getattr(self, key) is _MISSING:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'Suspect({self.to_dict()!r})'
+
+    def to_dict(self):
+        """Исходный словарь записи (для JSON, журнала и ответов)"""
+        if self._extra is None:
+            dates = _dates
+            return {
+                'id': self.id,
+                'full_name': self.full_name,
+                'alias': list(self.alias),
+                'date_of_birth': dates.get(self.date_of_birth),
+                'birth_place': self.birth_place,
+                'nationality': self.nationality,
+                'crime_type': self.crime_type,
+                'crime_details': self.crime_details,
+                'status': self.status,
+                'last_seen': dates.get(self.last_seen),
+                'last_seen_location': self.last_seen_location,
+                'danger_level': self.danger_level,
+                'added_date': dates.get(self.added_date),
+                'case_number': self.case_number,
+                'investigator': self.investigator,
+                'notes': self.notes,
+            }
+        result = {}
+        for field, kind in _KINDS.items():
+            value = getattr(self, field)
+            if value is not _MISSING:
+                result[field] = _expand(kind, value)
+        result.update(self._extra)
+        return result
+
+    def date_ordinal(self, field):
+        """Ординал даты поля без разбора строки; None, если дата не в YYYY-MM-DD"""
+        value = getattr(self, field)
+        return value if type(value) is int else None
+
+
+# Как хранится поле: None - как есть, str - интернируется, date - ординалом,
+# list - кортежем
+_KINDS = dict.fromkeys(FIELDS)
+_KINDS.update(dict.fromkeys(CATEGORICAL_FIELDS, str))
+_KINDS.update(dict.fromkeys(DATE_FIELDS, date))
+_KINDS['alias'] = list
+
+
+def _compact_regular(record, strings=_strings, ordinals=_ordinals):
+    # Развёрнуто по полям: на миллионе записей цикл с проверками стоит секунды.
+    # strings.get() точен: в _strings только str, а str не равна не-строке
+    s = Suspect.__new__(Suspect)
+    alias = record['alias']
+    if type(alias) is not list:
+        raise _Irregular
+    s.id = record['id']
+    s.full_name = record['full_name']
+    s.alias = tuple(alias)
+    v = record['date_of_birth']
+    s.date_of_birth = ordinals.get(v) or _date_slot(v)
+    v = record['birth_place']
+    s.birth_place = strings.get(v) or _intern(v)
+    v = record['nationality']
+    s.nationality = strings.get(v) or _intern(v)
+    v = record['crime_type']
+    s.crime_type = strings.get(v) or _intern(v)
+    s.crime_details = record['crime_details']
+    v = record['status']
+    s.status = strings.get(v) or _intern(v)
+    v = record['last_seen']
+    s.last_seen = ordinals.get(v) or _date_slot(v)
+    s.last_seen_location = record['last_seen_location']
+    v = record['danger_level']
+    s.danger_level = strings.get(v) or _intern(v)
+    v = record['added_date']
+    s.added_date = ordinals.get(v) or _date_slot(v)
+    s.case_number = record['case_number']
+    v = record['investigator']
+    s.investigator = strings.get(v) or _intern(v)
+    s.notes = record['notes']
+    s._extra = None
+    return s
+
+
+def to_dict(record):
+    """Исходный словарь записи: Suspect разворачивается, словарь - как есть"""
+    return record.to_dict() if type(record) is Suspect else record
+
+
+def compact(record):
+    """Suspect из словаря записи (уже компактная возвращается как есть)"""
+    if type(record) is Suspect:
+        return record
+    if len(record) == len(FIELDS):
+        try:
+            return _compact_regular(record)
+        except (_Irregular, KeyError, TypeError):
+            pass  # необычная запись - общим путём
+    return Suspect(record)
@@ -0,0 +1,353 @@
+"""SQLite-бэкенд хранилища для нескольких процессов gunicorn.
+
+Все воркеры работают с одним файлом базы в режиме WAL: читатели не
+блокируют писателя и видят согласованный срез на время своей транзакции.
+У каждого потока каждого процесса своё соединение (sqlite3 кэширует
+подготовленные выражения на соединение, поэтому SQL здесь - константы).
+Поиск q= идёт через FTS5 с токенизатором trigram, статистика - через
+таблицу счётчиков, которую обновляет каждая пишущая транзакция.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from encoding import dumps
+from indexes import FACET_FIELDS, GRAM, StatsIndex, searchable_texts, stat_keys
+from store import SuspectStore, latest_changes
+
+SEPARATOR = '\x1f'  # между полями в search_text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS suspects (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    search_text TEXT NOT NULL,
+    crime_type,
+    danger_level,
+    status
+);
+CREATE INDEX IF NOT EXISTS suspects_crime_type ON suspects (crime_type);
+CREATE INDEX IF NOT EXISTS suspects_danger_level ON suspects (danger_level);
+CREATE INDEX IF NOT EXISTS suspects_status ON suspects (status);
+CREATE VIRTUAL TABLE IF NOT EXISTS suspects_fts USING fts5 (
+    search_text, content='suspects', content_rowid='id', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS stats (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY,
+    op TEXT NOT NULL,
+    id INTEGER NOT NULL
+);
+-- Журнал изменений полон начиная с этой версии
+INSERT OR IGNORE INTO meta (key, value)
+    SELECT 'changes_floor', coalesce((SELECT value FROM meta WHERE key = 'version'), 0);
+-- Эпоха: выбирается один раз для новой базы, версии сравнимы только внутри неё
+INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', random() & 4294967295);
+"""
+
+SQL_META = "SELECT key, value FROM meta"
+SQL_SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+SQL_GET = "SELECT data FROM suspects WHERE id = ?"
+SQL_GET_ROW = "SELECT data, search_text FROM suspects WHERE id = ?"
+SQL_GET_MANY = ("SELECT s.data FROM json_each(?) AS j JOIN suspects AS s ON s.id = j.value "
+                "ORDER BY j.key")
+SQL_IDS = "SELECT id FROM suspects ORDER BY id"
+SQL_EXISTING_IDS = ("SELECT s.id FROM json_each(?) AS j JOIN suspects AS s ON s.id = j.value "
+                    "ORDER BY j.key")
+SQL_INSERT = ("INSERT INTO suspects (id, data, search_text, crime_type, danger_level, status) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+SQL_UPDATE = ("UPDATE suspects SET data = ?, search_text = ?, crime_type = ?, danger_level = ?, "
+              "status = ? WHERE id = ?")
+SQL_DELETE = "DELETE FROM suspects WHERE id = ?"
+SQL_FTS_INSERT = "INSERT INTO suspects_fts (rowid, search_text) VALUES (?, ?)"
+SQL_FTS_DELETE = "INSERT INTO suspects_fts (suspects_fts, rowid, search_text) VALUES ('delete', ?, ?)"
+SQL_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+SQL_CHANGES = "SELECT version, op, id FROM changes WHERE version > ? AND version <= ? ORDER BY version"
+SQL_LOG_CHANGE = "INSERT INTO changes (version, op, id) VALUES (?, ?, ?)"
+SQL_TRIM_CHANGES = "DELETE FROM changes WHERE version <= ?"
+SQL_STATS = "SELECT kind, key, count FROM stats"
+SQL_BUMP_STAT = ("INSERT INTO stats (kind, key, count) VALUES (?, ?, ?) "
+                 "ON CONFLICT (kind, key) DO UPDATE SET count = count + excluded.count")
+SQL_DROP_EMPTY_STATS = "DELETE FROM stats WHERE count = 0"
+
+
+def _facet(value):
+    # Фильтры из строки запроса - всегда строки, так что нестроковое
+    # значение с ними не совпадёт; NULL ведёт себя так же
+    return value if isinstance(value, str) else None
+
+
+def _row(record):
+    search_text = SEPARATOR.join(searchable_texts(record))
+    return (dumps(record), search_text) + tuple(_facet(record.get(f)) for f in FACET_FIELDS)
+
+
+class SQLiteSnapshot:
+    """Срез базы: открытая читающая транзакция. close() её завершает."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._ids = None
+        self._stats = None
+        conn.execute('BEGIN')
+        meta = dict(conn.execute(SQL_META).fetchall())
+        self.epoch = meta.get('epoch', 0)
+        self.version = meta.get('version', 0)
+        self.next_id = meta.get('next_id', 1)
+        self._count = meta.get('count', 0)
+        self._changes_floor = meta.get('changes_floor', self.version)
+        self._closed = False
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._conn.execute('ROLLBACK')
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.get_many(self.ids()))
+
+    def all(self):
+        return self.get_many(self.ids())
+
+    def get(self, suspect_id):
+        data = self.encoded(suspect_id)
+        return json.loads(data) if data is not None else None
+
+    def get_many(self, ids):
+        return [json.loads(data) for data in self.encoded_many(ids)]
+
+    def ids(self):
+        if self._ids is None:
+            self._ids = [row[0] for row in self._conn.execute(SQL_IDS)]
+        return self._ids
+
+    def existing_ids(self, ids):
+        return [row[0] for row in self._conn.execute(SQL_EXISTING_IDS, (json.dumps(list(ids)),))]
+
+    def encoded(self, suspect_id):
+        row = self._conn.execute(SQL_GET, (suspect_id,)).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def encoded_many(self, ids):
+        rows = self._conn.execute(SQL_GET_MANY, (json.dumps(list(ids)),))
+        return [bytes(row[0]) for row in rows]
+
+    def changes_since(self, version):
+        if version < self._changes_floor or version > self.version:
+            return None
+        log = self._conn.execute(SQL_CHANGES, (version, self.version)).fetchall()
+        return latest_changes((self._changes_floor, log), version, self.version)
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            counts = [(kind, json.loads(key), count)
+                      for kind, key, count in self._conn.execute(SQL_STATS)]
+            self._stats = StatsIndex.from_counts(self._count, counts)
+        return self._stats
+
+    def search_ids(self, query='', crime_type='', danger_level='', status=''):
+        """Упорядоченные id: фильтры и кандидаты q= отбирает SQLite,
+        точную проверку подстроки - Python, как и в MemoryStore"""
+        conditions, params = [], []
+        for field, value in (('crime_type', crime_type),
+                             ('danger_level', danger_level),
+                             ('status', status)):
+            if value:
+                conditions.append(f'{field} = ?')
+                params.append(value)
+        if not query:
+            if not conditions:
+                return self.ids()
+            sql = f"SELECT id FROM suspects WHERE {' AND '.join(conditions)} ORDER BY id"
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+        if len(query) >= GRAM:
+            conditions.append('id IN (SELECT rowid FROM suspects_fts WHERE suspects_fts MATCH ?)')
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            conditions.append('instr(search_text, ?) > 0')
+            params.append(query)
+        sql = f"SELECT id, search_text FROM suspects WHERE {' AND '.join(conditions)} ORDER BY id"
+        return [
+            suspect_id for suspect_id, search_text in self._conn.execute(sql, params)
+            if any(query in text for text in search_text.split(SEPARATOR))
+        ]
+
+
+class SQLiteTransaction:
+    """Пишущая транзакция (BEGIN IMMEDIATE) с тем же интерфейсом, что Transaction."""
+
+    def __init__(self, conn, changelog_size):
+        self._conn = conn
+        self._changelog_size = changelog_size
+        meta = dict(conn.execute(SQL_META).fetchall())
+        self.version = meta.get('version', 0)
+        self.next_id = meta.get('next_id', 1)
+        self.count = meta.get('count', 0)
+        self.changes_floor = meta.get('changes_floor', 0)
+        self.entries = []  # (op, запись или id, версия)
+
+    def get(self, suspect_id):
+        row = self._conn.execute(SQL_GET, (suspect_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _bump_stats(self, record, delta):
+        self._conn.executemany(SQL_BUMP_STAT, [
+            (kind, json.dumps(key, ensure_ascii=False), delta) for kind, key in stat_keys(record)
+        ])
+
+    def insert(self, build):
+        record = build(self.next_id)
+        row = _row(record)
+        self._conn.execute(SQL_INSERT, (record['id'],) + row)
+        self._conn.execute(SQL_FTS_INSERT, (record['id'], row[1]))
+        self._bump_stats(record, 1)
+        self.next_id = max(self.next_id, record['id'] + 1)
+        self.count += 1
+        self.version += 1
+        self.entries.append(('put', record, self.version))
+        return record
+
+    def update(self, suspect_id, changes):
+        found = self._conn.execute(SQL_GET_ROW, (suspect_id,)).fetchone()
+        if found is None:
+            return None
+        old = json.loads(found[0])
+        record = {**old, **changes}
+        row = _row(record)
+        self._conn.execute(SQL_UPDATE, row + (suspect_id,))
+        self._conn.execute(SQL_FTS_DELETE, (suspect_id, found[1]))
+        self._conn.execute(SQL_FTS_INSERT, (suspect_id, row[1]))
+        self._bump_stats(old, -1)
+        self._bump_stats(record, 1)
+        self.version += 1
+        self.entries.append(('put', record, self.version))
+        return record
+
+    def delete(self, suspect_id):
+        found = self._conn.execute(SQL_GET_ROW, (suspect_id,)).fetchone()
+        if found is None:
+            return False
+        self._conn.execute(SQL_FTS_DELETE, (suspect_id, found[1]))
+        self._conn.execute(SQL_DELETE, (suspect_id,))
+        self._bump_stats(json.loads(found[0]), -1)
+        self.count -= 1
+        self.version += 1
+        self.entries.append(('del', suspect_id, self.version))
+        return True
+
+    def finish(self):
+        self._conn.execute(SQL_DROP_EMPTY_STATS)
+        self._conn.executemany(SQL_LOG_CHANGE, [
+            (version, op, payload['id'] if op == 'put' else payload)
+            for op, payload, version in self.entries
+        ])
+        if self.version - self.changes_floor > 2 * self._changelog_size:
+            self.changes_floor = self.version - self._changelog_size
+            self._conn.execute(SQL_TRIM_CHANGES, (self.changes_floor,))
+        self._conn.executemany(SQL_SET_META, [
+            ('version', self.version), ('next_id', self.next_id), ('count', self.count),
+            ('changes_floor', self.changes_floor),
+        ])
+
+
+class SQLiteStore(SuspectStore):
+    """Хранилище в файле SQLite, общее для всех воркеров."""
+
+    def __init__(self, path, seed_records=(), seed_next_id=1, changelog_size=10000,
+                 poll_interval=0.5):
+        self.path = path
+        self.changelog_size = changelog_size
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        with self.transaction() as tx:
+            # Первый запуск: заполняем стартовыми записями
+            if tx.version == 0 and tx.count == 0:
+                for record in seed_records:
+                    tx.insert(lambda new_id, record=record: record)
+                tx.next_id = max(tx.next_id, seed_next_id)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               cached_statements=256)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA busy_timeout = 5000')
+        return conn
+
+    def _connections(self):
+        """Соединения текущего потока; после fork создаются заново"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.read = local.write = None
+        return local
+
+    def _connection(self):
+        local = self._connections()
+        if local.read is None:
+            local.read = self._open()
+        return local.read
+
+    def _write_connection(self):
+        # Отдельное соединение для записи: в том же потоке может быть открыт
+        # читающий снапшот текущего запроса
+        local = self._connections()
+        if local.write is None:
+            local.write = self._open()
+        return local.write
+
+    def snapshot(self):
+        conn = self._connection()
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')  # снапшот прошлого запроса не закрыли
+        return SQLiteSnapshot(conn)
+
+    def wait_for_change(self, version, timeout):
+        """Опрашивает версию в базе: писать мог любой воркер"""
+        conn = self._write_connection()  # вне transaction() оно свободно
+        deadline = time.monotonic() + timeout
+        while True:
+            row = conn.execute(SQL_VERSION).fetchone()
+            if (row[0] if row else 0) != version:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    @contextmanager
+    def transaction(self):
+        conn = self._write_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            tx = SQLiteTransaction(conn, self.changelog_size)
+            next_id = tx.next_id
+            yield tx
+            if tx.entries or tx.next_id != next_id:
+                tx.finish()
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
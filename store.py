@@ -0,0 +1,597 @@
+"""Хранилище подозреваемых: общий интерфейс и бэкенд в памяти.
+
+SuspectStore описывает, что нужно обработчикам CRUD, поиска и статистики;
+MemoryStore держит всё в памяти процесса (с журналом на диске), а
+SQLiteStore из sqlite_store.py - в общей для всех воркеров базе.
+
+В MemoryStore записи лежат в RecordMap id -> запись: он же первичный
+индекс, поэтому поиск по id выполняется за O(1), а записи выдаются по
+возрастанию id.
+
+Конкурентность: читатели берут неизменяемый Snapshot и работают с ним без
+блокировок; писатели проходят через одну блокировку, собирают изменения
+в транзакции поверх копии состояния (copy-on-write) и публикуют новый
+снапшот одним присваиванием. Записи тоже не меняются на месте: изменение
+создаёт новую запись, так что сериализуемая в этот момент запись цела.
+Хранятся они компактными Suspect (records.py) - для читателей это
+неизменяемые Mapping, а в журнал и ответы уходят обычные словари. С
+lazy=True загруженные записи остаются словарями до warm_up(), который
+сжимает их по куску RecordMap за раз.
+"""
+import gc
+import logging
+import secrets
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import chain, groupby
+from operator import itemgetter
+
+from columns import ColumnIndex, numpy
+from encoding import dumps
+from records import Suspect, compact, to_dict
+from indexes import CHUNK_BITS, GRAM, FacetIndex, StatsIndex, TrigramIndex, searchable_texts, trigram_candidates
+
+logger = logging.getLogger(__name__)
+
+
+class SuspectStore:
+    """Интерфейс хранилища.
+
+    snapshot() возвращает согласованный срез для чтения с методами
+    epoch, version, __len__, get, get_many, ids, existing_ids, encoded, encoded_many, search_ids,
+    changes_since, stats и close(). transaction() - контекстный менеджер,
+    внутри которого объект с get/insert/update/delete; изменения видны
+    читателям только целиком после выхода из блока. wait_for_change()
+    блокирует поток до следующей версии или до таймаута.
+
+    Записи из снапшота - неизменяемые Mapping (dict или records.Suspect);
+    insert и update возвращают обычный словарь.
+
+    version сравнима только внутри одной эпохи (epoch): если состояние
+    начато заново (нет каталога данных или файла базы), версии снова
+    идут с нуля, но эпоха уже другая.
+    """
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def transaction(self):
+        raise NotImplementedError
+
+    def wait_for_change(self, version, timeout):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Достраивает то, что ленится строиться при старте (вызывается в фоне)"""
+
+    # Короткие пути для одиночных операций
+    def get(self, suspect_id):
+        snapshot = self.snapshot()
+        try:
+            return snapshot.get(suspect_id)
+        finally:
+            snapshot.close()
+
+    def __len__(self):
+        snapshot = self.snapshot()
+        try:
+            return len(snapshot)
+        finally:
+            snapshot.close()
+
+    def insert(self, build):
+        with self.transaction() as tx:
+            return tx.insert(build)
+
+    def update(self, suspect_id, changes):
+        with self.transaction() as tx:
+            return tx.update(suspect_id, changes)
+
+    def delete(self, suspect_id):
+        with self.transaction() as tx:
+            return tx.delete(suspect_id)
+
+
+class RecordMap:
+    """id -> запись, разложенные по кускам соседних id.
+
+    Как и FacetIndex, опубликованная карта не меняется: copy() копирует
+    только оглавление кусков, а черновик копирует кусок при первом его
+    изменении. Так запись стоит O(размер куска + число кусков), а не
+    O(числа записей). Внутри куска id идут по возрастанию, пока новые id
+    больше прежних (их выдаёт хранилище).
+    """
+
+    def __init__(self, records=()):
+        """records - пары (id, запись)"""
+        self._chunks = {}
+        self._owned = set()
+        for key, items in groupby(records, key=lambda item: item[0] >> CHUNK_BITS):
+            self._chunks.setdefault(key, {}).update(items)
+        self._len = sum(map(len, self._chunks.values()))
+
+    def copy(self):
+        draft = RecordMap.__new__(RecordMap)
+        draft._chunks = dict(self._chunks)
+        draft._owned = set()
+        draft._len = self._len
+        return draft
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, suspect_id):
+        chunk = self._chunks.get(suspect_id >> CHUNK_BITS)
+        return chunk is not None and suspect_id in chunk
+
+    def get(self, suspect_id, default=None):
+        chunk = self._chunks.get(suspect_id >> CHUNK_BITS)
+        if chunk is None:
+            return default
+        return chunk.get(suspect_id, default)
+
+    def get_many(self, ids):
+        """Записи по id в том же порядке; None там, где записи нет"""
+        chunks = self._chunks
+        result = []
+        # Соседние id обычно в одном куске - словарь куска берём один раз
+        # (__rrshift__: suspect_id >> CHUNK_BITS без вызова лямбды на каждый id)
+        for key, group in groupby(ids, key=CHUNK_BITS.__rrshift__):
+            chunk = chunks.get(key)
+            if chunk is None:
+                result.extend(None for _ in group)
+            else:
+                result.extend(map(chunk.get, group))
+        return result
+
+    def _ordered(self):
+        chunks = self._chunks
+        return [chunks[key] for key in sorted(chunks)]
+
+    def __iter__(self):
+        """id по возрастанию"""
+        return chain.from_iterable(self._ordered())
+
+    def values(self):
+        return chain.from_iterable(chunk.values() for chunk in self._ordered())
+
+    def _writable(self, key):
+        if key not in self._owned:
+            self._chunks[key] = dict(self._chunks.get(key) or ())
+            self._owned.add(key)
+        return self._chunks[key]
+
+    def __setitem__(self, suspect_id, record):
+        chunk = self._writable(suspect_id >> CHUNK_BITS)
+        if suspect_id not in chunk:
+            self._len += 1
+        chunk[suspect_id] = record
+
+    def chunk_keys(self):
+        return list(self._chunks)
+
+    def compacted(self, key):
+        """Копия, где кусок key собран из Suspect; self, если он уже такой"""
+        chunk = self._chunks.get(key)
+        if chunk is None or all(type(r) is Suspect for r in chunk.values()):
+            return self
+        draft = self.copy()
+        draft._chunks[key] = {suspect_id: compact(r) for suspect_id, r in chunk.items()}
+        draft._owned.add(key)
+        return draft
+
+    def pop(self, suspect_id, default=None):
+        if suspect_id not in self:
+            return default
+        key = suspect_id >> CHUNK_BITS
+        chunk = self._writable(key)
+        record = chunk.pop(suspect_id)
+        self._len -= 1
+        if not chunk:
+            del self._chunks[key]
+            self._owned.discard(key)
+        return record
+
+
+def new_epoch():
+    """Случайная эпоха для состояния, начатого с нуля"""
+    return secrets.randbits(32)
+
+
+class Snapshot:
+    """Неизменяемый срез хранилища на момент версии version."""
+
+    def __init__(self, version, next_id, by_id, facets, stats, postings, caches, request_index,
+                 changes, request_derived=None, epoch=0):
+        self.epoch = epoch
+        self.version = version
+        self.next_id = next_id
+        self._facets = facets  # None - ещё не построены, см. MemoryStore._initial_indexes
+        self._stats = stats
+        self._request_derived = request_derived
+        self._by_id = by_id
+        self._postings = postings  # None - триграммный индекс ещё не построен
+        self._encoded, self._texts = caches
+        self._request_index = request_index
+        self._changes = changes  # (версия, с которой журнал изменений полон; [(версия, op, id)])
+        self._ids = None
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    @property
+    def facets(self):
+        if self._facets is None:
+            self._facets, self._stats = self._request_derived()
+        return self._facets
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._facets, self._stats = self._request_derived()
+        return self._stats
+
+    def all(self):
+        return list(self._by_id.values())
+
+    def get(self, suspect_id):
+        return self._by_id.get(suspect_id)
+
+    def ids(self):
+        """Все id по возрастанию (он же порядок выдачи)"""
+        if self._ids is None:
+            self._ids = list(self._by_id)
+        return self._ids
+
+    def get_many(self, ids):
+        """Записи по списку id в том же порядке; отсутствующие пропускаются"""
+        return [r for r in self._by_id.get_many(ids) if r is not None]
+
+    def existing_ids(self, ids):
+        """Те id из списка, что есть в снапшоте (порядок сохраняется)"""
+        by_id = self._by_id
+        return [suspect_id for suspect_id in ids if suspect_id in by_id]
+
+    def close(self):
+        """Снапшот в памяти ничего не держит"""
+
+    def changes_since(self, version):
+        """(изменённые id, удалённые id) после version по возрастанию или None,
+        если журнал изменений этот промежуток уже не покрывает"""
+        return latest_changes(self._changes, version, self.version)
+
+    # === ГОТОВЫЙ JSON ===
+    # Кэши общие для всех снапшотов: элемент кэша (запись, значение) верен,
+    # только пока запись в снапшоте - тот же самый объект
+    def encoded(self, suspect_id):
+        """JSON записи в байтах (из кэша), None если записи нет"""
+        record = self._by_id.get(suspect_id)
+        if record is None:
+            return None
+        entry = self._encoded.get(suspect_id)
+        if entry is not None and entry[0] is record:
+            return entry[1]
+        data = dumps(to_dict(record))
+        self._encoded[suspect_id] = (record, data)
+        return data
+
+    def encoded_many(self, ids):
+        """Готовые JSON-фрагменты по списку id; отсутствующие пропускаются"""
+        cache = self._encoded
+        result = []
+        for suspect_id, record in zip(ids, self._by_id.get_many(ids)):
+            if record is None:
+                continue
+            entry = cache.get(suspect_id)
+            if entry is not None and entry[0] is record:
+                result.append(entry[1])
+            else:
+                result.append(self.encoded(suspect_id))
+        return result
+
+    def _searchable(self, suspect_id, record):
+        entry = self._texts.get(suspect_id)
+        if entry is not None and entry[0] is record:
+            return entry[1]
+        texts = searchable_texts(record)
+        self._texts[suspect_id] = (record, texts)
+        return texts
+
+    # === ПОИСК ===
+    def search_ids(self, query='', crime_type='', danger_level='', status=''):
+        """Упорядоченные id записей, где query (в нижнем регистре) - подстрока
+        имени, псевдонима, деталей или места рождения, с точным совпадением
+        фильтров"""
+        filters = [(field, value) for field, value in (
+            ('crime_type', crime_type),
+            ('danger_level', danger_level),
+            ('status', status),
+        ) if value]
+        if not query:
+            return self.facets.match_ids(filters) if filters else self.ids()
+        if self._postings is None:
+            self._request_index()
+        if self._postings is not None and len(query) >= GRAM:
+            candidates = trigram_candidates(self._postings, query)
+            if filters:
+                candidates = self.facets.select(candidates, filters)
+        else:
+            # Индекса ещё нет или запрос короче триграммы - проверяем всех,
+            # но по уже приведённым к нижнему регистру строкам
+            candidates = self.facets.match_ids(filters) if filters else self.ids()
+        candidates = sorted(candidates)
+        searchable = self._searchable
+        return [
+            suspect_id for suspect_id, record in zip(candidates, self._by_id.get_many(candidates))
+            if record is not None and any(query in s for s in searchable(suspect_id, record))
+        ]
+
+
+def latest_changes(changes, since, until):
+    floor, log = changes
+    if since < floor or since > until:
+        return None
+    latest = {}
+    for version, op, suspect_id in log[bisect_right(log, since, key=itemgetter(0)):]:
+        if version > until:
+            break
+        latest[suspect_id] = op
+    updated = sorted(i for i, op in latest.items() if op == 'put')
+    deleted = sorted(i for i, op in latest.items() if op == 'del')
+    return updated, deleted
+
+
+class Transaction:
+    """Черновик изменений поверх снапшота. Создаётся только в
+    MemoryStore.transaction(), то есть под блокировкой писателя."""
+
+    def __init__(self, base, text_index, texts_cache):
+        self.version = base.version
+        self.next_id = base.next_id
+        self.by_id = base._by_id.copy()
+        self.facets = base.facets.copy()
+        self.stats = base.stats.copy()
+        self.text_index = text_index
+        self.entries = []  # (op, запись или id, версия) для журнала
+        self.deleted = []
+        self._texts = texts_cache
+
+    def get(self, suspect_id):
+        return self.by_id.get(suspect_id)
+
+    def _index(self, record):
+        self.facets.add(record)
+        self.stats.add(record)
+        if self.text_index is not None:
+            texts = searchable_texts(record)
+            self._texts[record['id']] = (record, texts)
+            self.text_index.add(record['id'], texts)
+
+    def _unindex(self, record):
+        self.facets.remove(record)
+        self.stats.remove(record)
+        if self.text_index is not None:
+            entry = self._texts.get(record['id'])
+            texts = entry[1] if entry is not None and entry[0] is record else searchable_texts(record)
+            self.text_index.remove(texts)
+
+    def insert(self, build):
+        """Добавляет запись build(new_id); id выдаётся здесь, под блокировкой"""
+        record = build(self.next_id)
+        stored = compact(record)
+        self.by_id[record['id']] = stored
+        self.next_id = max(self.next_id, record['id'] + 1)
+        self._index(stored)
+        self.version += 1
+        self.entries.append(('put', record, self.version))
+        return record
+
+    def update(self, suspect_id, changes):
+        """Новая запись = старая + changes, None если записи нет"""
+        old = self.by_id.get(suspect_id)
+        if old is None:
+            return None
+        record = {**to_dict(old), **changes}
+        stored = compact(record)
+        self.by_id[suspect_id] = stored
+        self._unindex(old)
+        self._index(stored)
+        self.version += 1
+        self.entries.append(('put', record, self.version))
+        return record
+
+    def delete(self, suspect_id):
+        """Удаляет запись, False если записи нет"""
+        old = self.by_id.pop(suspect_id, None)
+        if old is None:
+            return False
+        self._unindex(old)
+        self.deleted.append(suspect_id)
+        self.version += 1
+        self.entries.append(('del', suspect_id, self.version))
+        return True
+
+
+def compact_all(records):
+    """RecordMap из Suspect по записям; сотни тысяч объектов подряд -
+    сборщик мусора тут только мешает (как и в Journal.load)"""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return RecordMap((r['id'], compact(r)) for r in records)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+class MemoryStore(SuspectStore):
+    """Хранилище в памяти: текущий снапшот, блокировка писателя и журнал.
+
+    version монотонно растёт с каждой мутацией и переживает перезапуск
+    (пишется в журнал), поэтому вместе с epoch годится для ETag. Эпоха
+    берётся из журнала, а без него (или в новом каталоге) выбирается
+    заново. Последние changelog_size операций хранятся в журнале
+    изменений для changes_since().
+    """
+
+    def __init__(self, records=(), next_id=1, journal=None, version=0, changelog_size=10000,
+                 lazy=False, columnar=True):
+        self.journal = journal
+        self.changelog_size = changelog_size
+        self.epoch = journal.epoch if journal is not None else None
+        if self.epoch is None:
+            self.epoch = new_epoch()
+            if journal is not None:
+                journal.record_epoch(self.epoch)
+        # Фильтры и начальная статистика - по колонкам NumPy (columns.py), если он есть
+        self.columnar = columnar and numpy is not None
+        self._changes = (version, [])  # до перезапуска изменений не знаем
+        self._changed = threading.Condition()
+        self._lock = threading.Lock()
+        self._text_index = None
+        self._index_lock = threading.Lock()
+        self._index_thread = None
+        self._compact_thread = None
+        self._caches = ({}, {})  # готовый JSON и строки для поиска - общие для снапшотов
+        # lazy: компактные записи, фасеты и статистику по загруженным
+        # записям строим не при старте, а в warm_up() (индексы - и по
+        # первому обращению)
+        by_id = RecordMap((r['id'], r) for r in records) if lazy else compact_all(records)
+        self._initial = (by_id, None)
+        self._initial_lock = threading.Lock()
+        if not lazy:
+            self._initial_indexes()
+        self._state = self._snapshot(version, next_id, by_id, *self._initial[1] or (None, None))
+
+    def _initial_indexes(self):
+        """(FacetIndex или ColumnIndex, StatsIndex) начального состояния. До
+        первой записи все снапшоты делят один by_id, так что построенное
+        годится каждому из них."""
+        with self._initial_lock:
+            by_id, indexes = self._initial
+            if indexes is None:
+                if self.columnar:
+                    columns = ColumnIndex(by_id.values())
+                    indexes = (columns, columns.stats())
+                else:
+                    indexes = (FacetIndex(by_id.values()), StatsIndex(by_id.values()))
+                self._initial = (None, indexes)
+            return indexes
+
+    def _snapshot(self, version, next_id, by_id, facets, stats):
+        postings = self._text_index.postings if self._text_index is not None else None
+        return Snapshot(version, next_id, by_id, facets, stats, postings,
+                        self._caches, self._build_text_index_async, self._changes,
+                        self._initial_indexes, self.epoch)
+
+    def snapshot(self):
+        """Текущий снапшот; читать его можно без блокировок"""
+        return self._state
+
+    def wait_for_change(self, version, timeout):
+        """True, если за timeout секунд появилась версия новее version"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._state.version != version, timeout)
+
+    def warm_up(self):
+        self._initial_indexes()
+        self.compact_records()
+        self.build_text_index()
+
+    def compact_records(self):
+        """Заменяет загруженные словари на Suspect. Блокировка писателя
+        берётся на один кусок RecordMap, так что записи ждут миллисекунды,
+        а не весь проход"""
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for key in self._state._by_id.chunk_keys():
+                with self._lock:
+                    state = self._state
+                    by_id = state._by_id.compacted(key)
+                    if by_id is not state._by_id:
+                        self._state = self._snapshot(state.version, state.next_id, by_id,
+                                                     state._facets, state._stats)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    # === МУТАЦИИ ===
+    @contextmanager
+    def transaction(self):
+        """Все изменения внутри блока публикуются одним снапшотом"""
+        with self._lock:
+            tx = Transaction(self._state, self._text_index, self._caches[1])
+            yield tx
+            if tx.entries:
+                self._commit(tx)
+
+    def _commit(self, tx):
+        # Сначала журнал: если запись на диск не удалась, снапшот не меняется
+        if self.journal:
+            self.journal.append_batch(tx.entries)
+
+        self._log_changes(tx.entries)
+        if self._text_index is not None and self._text_index.needs_rebuild:
+            self._text_index = self._new_text_index(tx.by_id.values())
+        with self._changed:
+            self._state = self._snapshot(tx.version, tx.next_id, tx.by_id, tx.facets, tx.stats)
+            self._changed.notify_all()
+
+        for suspect_id in tx.deleted:
+            for cache in self._caches:
+                cache.pop(suspect_id, None)
+        if self.journal and self.journal.should_compact() and self.journal.begin_compaction():
+            # Журнал уже отложен под блокировкой; снапшот пишется в фоне
+            self._compact_thread = threading.Thread(target=self._compact, args=(self._state,),
+                                                    daemon=True)
+            self._compact_thread.start()
+
+    def _compact(self, snapshot):
+        try:
+            self.journal.finish_compaction(map(to_dict, snapshot), snapshot.next_id,
+                                           snapshot.version)
+        except Exception:
+            # Отложенный журнал остаётся на диске и склеится с новым при старте
+            logger.exception("❌ Не удалось свернуть журнал")
+
+    def _log_changes(self, entries):
+        # В список только дописывают; при обрезке он заменяется новым, так что
+        # старые снапшоты читают свой экземпляр без блокировок
+        floor, log = self._changes
+        log.extend((version, op, payload['id'] if op == 'put' else payload)
+                   for op, payload, version in entries)
+        if len(log) > 2 * self.changelog_size:
+            log = log[-self.changelog_size:]
+            self._changes = (log[0][0] - 1, log)
+
+    # === ТРИГРАММНЫЙ ИНДЕКС ===
+    def _new_text_index(self, records):
+        texts_cache = self._caches[1]
+        items = []
+        for record in records:
+            texts = searchable_texts(record)
+            texts_cache[record['id']] = (record, texts)
+            items.append((record['id'], texts))
+        return TrigramIndex(items)
+
+    def build_text_index(self):
+        """Строит индекс по текущему состоянию и публикует снапшот с ним.
+        Пока индекса нет, поиск q= работает перебором."""
+        with self._lock:
+            if self._text_index is not None:
+                return
+            state = self._state
+            self._text_index = self._new_text_index(state)
+            self._state = self._snapshot(state.version, state.next_id, state._by_id,
+                                         state._facets, state._stats)
+
+    def _build_text_index_async(self):
+        with self._index_lock:
+            if self._index_thread is None:
+                self._index_thread = threading.Thread(target=self.build_text_index, daemon=True)
+                self._index_thread.start()
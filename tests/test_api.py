@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+
+os.environ['DATA_DIR'] = ''  # без диска: только стартовые записи
+os.environ['WARM_UP'] = '0'
+
+import pytest
+
+import app as app_module
+
+logging.getLogger('access').disabled = True
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize('since', ['²', '-1', 'abc'])
+def test_changes_rejects_non_version_since(client, since):
+    response = client.get(f'/api/suspects/changes?since={since}')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_events_rejects_non_version_since(client):
+    assert client.get('/api/suspects/events?since=²').status_code == 400
+    assert client.get('/api/suspects/events', headers={'Last-Event-ID': '²'}).status_code == 400
+
+
+def test_etag_does_not_survive_a_data_reset(client, monkeypatch):
+    etag = client.get('/api/suspects').headers['ETag']
+    assert client.get('/api/suspects', headers={'If-None-Match': etag}).status_code == 304
+
+    # Данные начаты заново (например, диск Render потерян): версия та же, эпоха другая
+    fresh = app_module.MemoryStore(app_module.SEED_SUSPECTS, app_module.SEED_NEXT_ID)
+    monkeypatch.setattr(app_module, 'store', fresh)
+    response = client.get('/api/suspects', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_missing_record_is_404_even_with_a_matching_etag(client):
+    etag = client.get('/api/suspects/1').headers['ETag']
+    assert client.get('/api/suspects/1', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/suspects/999', headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_changes_since_a_tag_from_another_epoch_needs_resync(client):
+    version = client.get('/api/bootstrap').get_json()['version']
+    assert client.get(f'/api/suspects/changes?since={version}').status_code == 200
+
+    epoch, _, number = version.partition('-')
+    other = f'{int(epoch, 16) ^ 1:08x}-{number}'
+    for since in (other, number):  # чужая эпоха или голая версия старого клиента
+        response = client.get(f'/api/suspects/changes?since={since}')
+        assert response.status_code == 410
+        assert response.get_json()['version'] == version
+
+
+def test_events_since_a_tag_from_another_epoch_resync_at_once(client):
+    response = client.get('/api/suspects/events?since=0')
+    body = b''.join(response.response)
+    response.close()
+    assert b'event: resync' in body
+
+
+def test_index_is_revalidated_by_etag(client):
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    again = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['Cache-Control'] == 'no-cache'
+
+
+def test_long_lists_are_streamed_by_default(client, monkeypatch):
+    buffered = client.get('/api/suspects')
+    assert 'Content-Length' in buffered.headers
+    monkeypatch.setattr(app_module, 'STREAM_MIN_RECORDS', 2)
+    streamed = client.get('/api/suspects')
+    assert 'Content-Length' not in streamed.headers  # chunked
+    assert streamed.get_data() == buffered.get_data()
+    assert 'Content-Length' in client.get('/api/suspects?stream=0').headers
+    assert 'Content-Length' in client.get('/api/suspects?limit=1').headers
+
+
+@pytest.fixture
+def journaled(tmp_path, monkeypatch):
+    """Хранилище с журналом на диске; считает публикации и записи журнала"""
+    journal = app_module.Journal(str(tmp_path), fsync=False)
+    store = app_module.MemoryStore(app_module.SEED_SUSPECTS, app_module.SEED_NEXT_ID, journal)
+    calls = {'commit': 0, 'append_batch': 0}
+
+    def counted(name, method):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(store, '_commit', counted('commit', store._commit))
+    monkeypatch.setattr(journal, 'append_batch', counted('append_batch', journal.append_batch))
+    monkeypatch.setattr(app_module, 'store', store)
+    yield store, calls
+    journal.close()
+
+
+def journal_size(store):
+    return os.path.getsize(store.journal.journal_path) if os.path.exists(store.journal.journal_path) else 0
+
+
+def test_bulk_applies_a_mixed_batch_in_one_commit(client, journaled):
+    store, calls = journaled
+    version = store.snapshot().version
+    response = client.post('/api/suspects/bulk', json=[
+        {'op': 'create', 'data': {'full_name': 'Новый Подозреваемый'}},
+        {'op': 'update', 'id': 1, 'data': {'status': 'задержан'}},
+        {'op': 'delete', 'id': 2},
+        {'op': 'delete', 'id': 999},
+        {'op': 'update', 'data': {}},
+    ])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['applied'] == 3
+    assert [r['status'] for r in body['data']] == ['created', 'updated', 'deleted', 'error', 'error']
+    assert [r['index'] for r in body['data']] == [0, 1, 2, 3, 4]
+
+    snapshot = store.snapshot()
+    assert snapshot.version == version + 3
+    assert store.get(body['data'][0]['id'])['full_name'] == 'Новый Подозреваемый'
+    assert store.get(1)['status'] == 'задержан' and store.get(2) is None
+    assert calls == {'commit': 1, 'append_batch': 1}
+
+
+def test_bulk_accepts_ndjson(client, journaled):
+    store, calls = journaled
+    body = ('{"op": "update", "id": 1, "data": {"notes": "из NDJSON"}}\n'
+            '\n'
+            '{"op": "create", "data": {"full_name": "Второй"}}\n')
+    response = client.post('/api/suspects/bulk', data=body.encode('utf-8'),
+                           content_type=app_module.NDJSON_MIMETYPE)
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 2
+    assert store.get(1)['notes'] == 'из NDJSON'
+    assert calls == {'commit': 1, 'append_batch': 1}
+
+
+@pytest.mark.parametrize('bad', [
+    {'op': 'delete', 'id': 999},      # не найден уже внутри транзакции
+    {'op': 'create', 'data': {}},     # не прошёл проверку до транзакции
+])
+def test_atomic_bulk_rejects_the_whole_batch(client, journaled, bad):
+    store, calls = journaled
+    version, size = store.snapshot().version, journal_size(store)
+    response = client.post('/api/suspects/bulk?atomic=1', json=[
+        {'op': 'update', 'id': 1, 'data': {'status': 'задержан'}},
+        {'op': 'delete', 'id': 2},
+        bad,
+    ])
+    body = response.get_json()
+    assert response.status_code == 400
+    assert body['applied'] == 0
+    assert [r['status'] for r in body['data']] == ['skipped', 'skipped', 'error']
+    assert store.snapshot().version == version
+    assert store.get(1)['status'] != 'задержан' and store.get(2) is not None
+    assert journal_size(store) == size
+    assert calls == {'commit': 0, 'append_batch': 0}
+
+
+def test_bulk_limits_the_number_of_operations(client, journaled, monkeypatch):
+    store, calls = journaled
+    monkeypatch.setattr(app_module, 'MAX_BULK_OPS', 2)
+    ops = [{'op': 'create', 'data': {'full_name': f'Новый {i}'}} for i in range(3)]
+    assert client.post('/api/suspects/bulk', json=ops).status_code == 413
+    assert client.post('/api/suspects/bulk', json=ops[:2]).status_code == 200
+    assert calls == {'commit': 1, 'append_batch': 1}
+
+
+@pytest.fixture
+def fresh_store(monkeypatch):
+    def make(changelog_size=10000):
+        store = app_module.MemoryStore(app_module.SEED_SUSPECTS, app_module.SEED_NEXT_ID,
+                                       changelog_size=changelog_size)
+        monkeypatch.setattr(app_module, 'store', store)
+        return store
+    return make
+
+
+def read_events(response, until=b'event: version'):
+    """Куски SSE-ленты до первого события until; поток потом закрывается"""
+    body = b''
+    try:
+        for chunk in response.response:
+            body += chunk
+            if until in body:
+                break
+    finally:
+        response.close()
+    return [dict(line.split(': ', 1) for line in event.decode().splitlines())
+            for event in body.split(b'\n\n') if event and not event.startswith(b'retry')]
+
+
+def write_after_bootstrap(client, store):
+    """(since до записей, версия после них): запись 1 изменена, 2 удалена"""
+    since = client.get('/api/bootstrap').get_json()['version']
+    store.update(1, {'status': 'задержан'})
+    store.delete(2)
+    return since, client.get('/api/bootstrap').get_json()['version']
+
+
+def test_changes_return_writes_after_since(client, fresh_store):
+    since, version = write_after_bootstrap(client, fresh_store())
+    changes = client.get(f'/api/suspects/changes?since={since}').get_json()
+    assert [r['id'] for r in changes['data']] == [1]
+    assert changes['data'][0]['status'] == 'задержан'
+    assert changes['deleted'] == [2]
+    assert changes['version'] == version
+    assert client.get(f'/api/suspects/changes?since={version}').get_json()['count'] == 0
+
+
+def test_events_stream_writes_after_since(client, fresh_store, monkeypatch):
+    monkeypatch.setattr(app_module, 'SSE_MAX_AGE', 5)
+    since, version = write_after_bootstrap(client, fresh_store())
+    events = read_events(client.get(f'/api/suspects/events?since={since}'))
+    assert [e['event'] for e in events] == ['put', 'delete', 'version']
+    assert json.loads(events[0]['data'])['status'] == 'задержан'
+    assert json.loads(events[1]['data']) == {'id': 2}
+    assert events[2]['id'] == version and 'id' not in events[0]
+
+
+def test_events_resume_from_last_event_id(client, fresh_store, monkeypatch):
+    monkeypatch.setattr(app_module, 'SSE_MAX_AGE', 5)
+    store = fresh_store()
+    store.update(1, {'status': 'задержан'})
+    last_event_id = client.get('/api/bootstrap').get_json()['version']
+    store.update(2, {'status': 'задержан'})
+
+    events = read_events(client.get('/api/suspects/events?since=0',
+                                    headers={'Last-Event-ID': last_event_id}))
+    assert [e['event'] for e in events] == ['put', 'version']
+    assert json.loads(events[0]['data'])['id'] == 2
+
+
+def test_changes_since_beyond_the_change_log_needs_resync(client, fresh_store):
+    store = fresh_store(changelog_size=2)
+    since = client.get('/api/bootstrap').get_json()['version']
+    for number in range(5):  # журнал обрезается, когда вдвое больше changelog_size
+        store.update(1, {'notes': f'правка {number}'})
+    version = client.get('/api/bootstrap').get_json()['version']
+
+    response = client.get(f'/api/suspects/changes?since={since}')
+    assert response.status_code == 410
+    assert response.get_json()['version'] == version
+    assert client.get(f'/api/suspects/changes?since={version}').status_code == 200
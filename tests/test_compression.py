@@ -0,0 +1,60 @@
+import pytest
+from flask import Flask, jsonify, request
+
+from compression import CompressionMiddleware
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/api/items')
+    def items():
+        response = jsonify(items=['запись'] * 200)
+        response.set_etag('v1')
+        return response.make_conditional(request)
+
+    @app.route('/api/missing')
+    def missing():
+        return jsonify(error='нет'), 404
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+    return app.test_client()
+
+
+def test_compressed_etag_round_trips_to_304(client):
+    response = client.get('/api/items', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == '"v1-gzip"'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    again = client.get('/api/items', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"v1-gzip"'})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == '"v1-gzip"'
+    assert again.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_identity_etag_is_not_suffixed(client):
+    response = client.get('/api/items', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == '"v1"'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    again = client.get('/api/items', headers={'If-None-Match': '"v1"'})
+    assert again.status_code == 304
+    assert again.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_errors_vary_on_accept_encoding(client):
+    response = client.get('/api/missing', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 404
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/api/items', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['ETag'] == '"v1-br"'
+    assert brotli.decompress(response.get_data()).startswith(b'{')
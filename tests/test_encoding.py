@@ -0,0 +1,26 @@
+import json
+
+from encoding import dumps
+
+
+def jsonify_bytes(obj):
+    # Так кодирует jsonify (без отладки): ensure_ascii, ключи по алфавиту, компактно
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode()
+
+
+def test_matches_jsonify_byte_for_byte():
+    record = {
+        'id': 7,
+        'full_name': 'Тестов Тест',
+        'alias': ['\x7f', 'é', '😀', ' ', 'a"b\\c\n'],
+        'notes': 2 ** 70,
+        'score': [1e16, 1.5, 1e-07, float('nan'), float('inf')],
+        'date_of_birth': None,
+        'flag': True,
+    }
+    assert dumps(record) == jsonify_bytes(record)
+    assert dumps(record).isascii()
+
+
+def test_tuples_encode_as_lists():
+    assert dumps({'alias': ('а', 'б')}) == jsonify_bytes({'alias': ['а', 'б']})
@@ -0,0 +1,20 @@
+import os
+import runpy
+
+import pytest
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+@pytest.mark.parametrize('env, workers', [
+    ({}, 1),
+    ({'WEB_CONCURRENCY': '4'}, 1),
+    ({'WEB_CONCURRENCY': '4', 'STORAGE_BACKEND': 'memory'}, 1),
+    ({'WEB_CONCURRENCY': '4', 'STORAGE_BACKEND': 'sqlite'}, 4),
+])
+def test_memory_backend_runs_a_single_worker(monkeypatch, env, workers):
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    monkeypatch.delenv('STORAGE_BACKEND', raising=False)
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    assert runpy.run_path(CONF)['workers'] == workers
@@ -0,0 +1,186 @@
+import os
+
+import pytest
+
+from journal import Journal
+from records import FIELDS
+from store import MemoryStore
+
+SEED = [{'id': 1, 'full_name': 'Первый'}, {'id': 2, 'full_name': 'Второй'}]
+
+
+def record(suspect_id, name):
+    return {'id': suspect_id, 'full_name': name}
+
+
+def reload(path):
+    """Состояние каталога глазами следующего запуска"""
+    journal = Journal(str(path), fsync=False)
+    try:
+        return journal.load(SEED, 3)
+    finally:
+        journal.close()
+
+
+def test_replays_snapshot_and_tail(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.append_batch([('del', 1, 2)])
+    journal.close()
+
+    records, next_id, version = reload(tmp_path)
+    assert sorted(r['id'] for r in records) == [2, 3]
+    assert (next_id, version) == (4, 2)
+
+
+def test_torn_tail_is_truncated_before_next_append(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.close()
+    # Падение посреди записи: строка без перевода строки
+    with open(journal.journal_path, 'ab') as f:
+        f.write(b'{"op": "put", "data": {"id": 4, "full_na')
+
+    journal = Journal(str(tmp_path), fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    assert sorted(r['id'] for r in records) == [1, 2, 3]
+    journal.append_batch([('put', record(4, 'Четвёртый'), 2)])
+    journal.append_batch([('put', record(5, 'Пятый'), 3)])
+    journal.close()
+
+    records, next_id, version = reload(tmp_path)
+    assert sorted(r['id'] for r in records) == [1, 2, 3, 4, 5]
+    assert (next_id, version) == (6, 3)
+
+
+def test_complete_entry_without_newline_is_dropped(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.close()
+    with open(journal.journal_path, 'rb+') as f:
+        f.truncate(len(f.read()) - 1)  # fsync не успел: запись не подтверждена
+
+    journal = Journal(str(tmp_path), fsync=False)
+    records, _, version = journal.load(SEED, 3)
+    assert sorted(r['id'] for r in records) == [1, 2]
+    assert version == 0
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.close()
+    records, _, version = reload(tmp_path)
+    assert sorted(r['id'] for r in records) == [1, 2, 3]
+
+
+def test_corruption_in_the_middle_is_an_error(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.close()
+    with open(journal.journal_path, 'ab') as f:
+        f.write(b'{"op": "put", "da\n{"op": "del", "id": 1, "v": 2}\n')
+
+    with pytest.raises(ValueError):
+        reload(tmp_path)
+
+
+def test_compact_resets_journal(tmp_path):
+    journal = Journal(str(tmp_path), compact_every=2, fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    journal.append_batch([('del', 2, 2)])
+    assert journal.should_compact()
+    journal.compact([SEED[0], record(3, 'Третий')], 4, 2)
+    assert not journal.should_compact()
+    journal.close()
+
+    records, next_id, version = reload(tmp_path)
+    assert sorted(r['id'] for r in records) == [1, 3]
+    assert (next_id, version) == (4, 2)
+
+
+def test_epoch_survives_restart_and_compaction(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    store = MemoryStore(records, next_id, journal, version)
+    epoch = store.epoch
+    store.insert(lambda new_id: record(new_id, 'Третий'))
+    journal.close()
+
+    journal = Journal(str(tmp_path), fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    assert MemoryStore(records, next_id, journal, version).epoch == epoch
+    journal.compact(records, next_id, version)
+    journal.close()
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    assert journal.epoch == epoch
+    journal.close()
+
+    # Каталог потерян - новая эпоха
+    other = Journal(str(tmp_path / 'fresh'), fsync=False)
+    records, next_id, version = other.load(SEED, 3)
+    assert MemoryStore(records, next_id, other, version).epoch != epoch
+
+
+def test_store_compacts_in_background(tmp_path):
+    journal = Journal(str(tmp_path), compact_every=3, fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    store = MemoryStore(records, next_id, journal, version)
+    store.insert(lambda new_id: record(new_id, 'Третий'))
+    store.delete(1)
+    store._compact_thread.join()
+    assert not os.path.exists(journal.old_journal_path)
+    assert journal.entries == 0
+    store.insert(lambda new_id: record(new_id, 'Четвёртый'))
+    journal.close()
+
+    journal = Journal(str(tmp_path), fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    assert sorted(r['id'] for r in records) == [2, 3, 4]
+    assert (next_id, version, journal.entries) == (5, 3, 1)
+
+
+def test_unfinished_compaction_is_replayed(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load(SEED, 3)
+    journal.append_batch([('put', record(3, 'Третий'), 1)])
+    assert journal.begin_compaction()
+    assert not journal.begin_compaction()  # одно сворачивание за раз
+    journal.append_batch([('del', 1, 2)])
+    journal.close()  # упали, не дописав снапшот
+
+    journal = Journal(str(tmp_path), fsync=False)
+    records, next_id, version = journal.load(SEED, 3)
+    assert sorted(r['id'] for r in records) == [2, 3]
+    assert (next_id, version, journal.entries) == (4, 2, 2)
+    assert not os.path.exists(journal.old_journal_path)
+    journal.append_batch([('put', record(4, 'Четвёртый'), 3)])
+    journal.close()
+
+    records, _, version = reload(tmp_path)
+    assert sorted(r['id'] for r in records) == [2, 3, 4]
+    assert version == 3
+
+
+def test_snapshot_keeps_regular_and_irregular_records(tmp_path):
+    regular = {field: None for field in FIELDS}
+    regular.update(id=1, full_name='Первый', alias=['П'], date_of_birth='1990-01-02')
+    irregular = {'id': 2, 'full_name': 'Второй', 'extra': {'a': [1]}}
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.load([], 1)
+    journal.compact([regular, irregular, dict(regular, id=3)], 4, 7)
+    journal.close()
+
+    records, next_id, version = reload(tmp_path)
+    assert records == [regular, irregular, dict(regular, id=3)]
+    assert (next_id, version) == (4, 7)
+
+
+def test_data_dir_is_locked_by_one_journal(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    with pytest.raises(RuntimeError):
+        Journal(str(tmp_path), fsync=False)
+    journal.close()
+    Journal(str(tmp_path), fsync=False).close()
@@ -0,0 +1,25 @@
+from werkzeug.test import Client
+
+from profiling import ProfilingMiddleware, list_profiles, top_functions
+
+
+def hello(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'hello']
+
+
+def test_profiles_of_one_route_in_one_second_are_all_kept(tmp_path):
+    client = Client(ProfilingMiddleware(hello, str(tmp_path)))
+    for _ in range(3):
+        response = client.get('/api/ping', headers={'X-Profile': '1'})
+        assert response.get_data() == b'hello'
+        response.close()
+    assert len(list_profiles(str(tmp_path))) == 3
+    assert top_functions(str(tmp_path))[0] == 3
+
+
+def test_only_requested_profiles_are_written(tmp_path):
+    client = Client(ProfilingMiddleware(hello, str(tmp_path), token='secret'))
+    client.get('/api/ping').close()
+    client.get('/api/ping', headers={'X-Profile': 'wrong'}).close()
+    assert list_profiles(str(tmp_path)) == []
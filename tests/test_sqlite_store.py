@@ -0,0 +1,88 @@
+import os
+import threading
+
+import pytest
+
+from sqlite_store import SQLiteStore
+from store import MemoryStore
+
+SEED = [
+    {'id': 1, 'full_name': 'Иванов Иван', 'alias': ['Ваня'], 'crime_type': 'Кража',
+     'danger_level': 'Высокий', 'status': 'В розыске', 'date_of_birth': '1990-05-01',
+     'birth_place': 'Омск'},
+    {'id': 2, 'full_name': 'Петров Пётр', 'alias': ['Иван'], 'crime_type': 'Кража',
+     'danger_level': 'Низкий', 'status': 'Задержан', 'date_of_birth': '2008-01-01',
+     'birth_place': 'Омск'},
+    {'id': 3, 'full_name': 'Сидоров', 'alias': [], 'crime_type': 'Мошенничество',
+     'danger_level': 'Высокий', 'status': 'В розыске', 'crime_details': 'взлом ван'},
+]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    return SQLiteStore(str(tmp_path / 'suspects.db'), SEED, 4), MemoryStore(SEED, 4)
+
+
+def read(store, get):
+    snapshot = store.snapshot()
+    try:
+        return get(snapshot)
+    finally:
+        snapshot.close()
+
+
+@pytest.mark.parametrize('query', ['иван', 'ван', 'ИВАН', 'ва', 'в', 'ов\x1fи', 'взлом ван', 'нет такого'])
+def test_fts_candidates_are_verified_like_memory_search(stores, query):
+    sqlite, memory = stores
+    # FTS5 trigram находит и без учёта регистра, и через границу полей -
+    # лишних кандидатов отсекает проверка подстроки
+    search = lambda s: (s.search_ids(query), s.search_ids(query, crime_type='Кража'))  # noqa: E731
+    assert read(sqlite, search) == read(memory, search)
+
+
+def test_stats_counters_follow_writes(stores):
+    sqlite, memory = stores
+    for store in stores:
+        store.update(1, {'crime_type': 'Мошенничество', 'birth_place': 'Томск'})
+        store.delete(2)
+        store.insert(lambda new_id: {'id': new_id, 'full_name': 'Новый', 'crime_type': 'Кража',
+                                     'date_of_birth': '2000-01-01'})
+    stats = lambda s: s.stats.snapshot(2026)  # noqa: E731
+    assert read(sqlite, stats) == read(memory, stats)
+    conn = sqlite._write_connection()
+    assert conn.execute('SELECT count(*) FROM stats WHERE count <= 0').fetchone()[0] == 0
+    assert conn.execute("SELECT count FROM stats WHERE key = '\"Омск\"'").fetchall() == []
+
+
+def test_wait_for_change_sees_writes_from_other_connections(tmp_path):
+    path = str(tmp_path / 'suspects.db')
+    store = SQLiteStore(path, SEED, 4, poll_interval=0.01)
+    version = read(store, lambda s: s.version)
+    assert not store.wait_for_change(version, 0.05)
+
+    other = SQLiteStore(path, poll_interval=0.01)  # как другой воркер
+    writer = threading.Timer(0.05, other.delete, (3,))
+    writer.start()
+    assert store.wait_for_change(version, 5)
+    writer.join()
+    assert read(store, lambda s: s.version) == version + 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='нужен fork')
+def test_connections_are_reopened_after_fork(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'suspects.db'), SEED, 4)
+    parent = store._connection()
+    assert len(store) == 3
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = store._connection() is not parent and len(store) == 3
+            store.insert(lambda new_id: {'id': new_id, 'full_name': 'Из воркера'})
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert store._connection() is parent
+    assert store.get(4)['full_name'] == 'Из воркера'
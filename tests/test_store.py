@@ -0,0 +1,103 @@
+import pytest
+
+from encoding import dumps
+from records import Suspect
+from sqlite_store import SQLiteStore
+from store import CHUNK_BITS, MemoryStore, RecordMap
+
+CHUNK = 1 << CHUNK_BITS
+
+
+def seed(count):
+    return [{'id': i, 'full_name': f'Подозреваемый {i}',
+             'crime_type': ('Кража', 'Мошенничество')[i % 2],
+             'danger_level': ('Низкий', 'Высокий')[i % 3 == 0],
+             'status': 'В розыске'} for i in range(1, count + 1)]
+
+
+def view(snapshot):
+    """Всё, что видит читатель снапшота"""
+    return (
+        snapshot.version, snapshot.next_id, len(snapshot), snapshot.ids(),
+        [dict(r) for r in snapshot.all()],
+        snapshot.search_ids('подозреваемый 1'),
+        snapshot.search_ids(crime_type='Кража', danger_level='Высокий'),
+        snapshot.search_ids('7', status='В розыске'),
+        snapshot.stats.snapshot(2026),
+    )
+
+
+@pytest.fixture(params=['columnar', 'facets', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteStore(str(tmp_path / 'suspects.db'), seed(3 * CHUNK), 3 * CHUNK + 1)
+    store = MemoryStore(seed(3 * CHUNK), 3 * CHUNK + 1, columnar=request.param == 'columnar')
+    store.warm_up()
+    return store
+
+
+def test_failed_transaction_leaves_snapshot_unchanged(store):
+    before = view(store.snapshot())
+    with pytest.raises(RuntimeError):
+        with store.transaction() as tx:
+            tx.update(5, {'full_name': 'Другой', 'crime_type': 'Грабёж'})
+            tx.delete(CHUNK + 1)
+            tx.insert(lambda new_id: {'id': new_id, 'full_name': 'Подозреваемый 1 новый'})
+            raise RuntimeError('откат')
+    assert view(store.snapshot()) == before
+
+    store.update(5, {'full_name': 'Другой'})
+    assert store.get(5)['full_name'] == 'Другой'
+    assert store.get(CHUNK + 1) is not None
+
+
+def test_old_snapshot_is_not_affected_by_later_writes(store):
+    old = store.snapshot()
+    before = view(old)
+    store.update(5, {'crime_type': 'Кража', 'danger_level': 'Высокий'})
+    store.delete(CHUNK + 1)
+    store.insert(lambda new_id: {'id': new_id, 'full_name': 'Подозреваемый 1 новый'})
+
+    assert view(old) == before
+    new = store.snapshot()
+    assert len(new) == len(old)
+    assert CHUNK + 1 not in new.ids() and 3 * CHUNK + 1 in new.ids()
+    assert 5 in new.search_ids(crime_type='Кража', danger_level='Высокий')
+    assert 3 * CHUNK + 1 in new.search_ids('подозреваемый 1')
+
+
+def test_record_map_copy_shares_untouched_chunks():
+    base = RecordMap((i, str(i)) for i in range(1, 3 * CHUNK))
+    draft = base.copy()
+    draft[2] = 'два'
+    draft.pop(CHUNK)
+    draft[3 * CHUNK] = 'новый'
+
+    assert base.get(2) == '2' and CHUNK in base and 3 * CHUNK not in base
+    assert draft.get(2) == 'два' and CHUNK not in draft and draft.get(3 * CHUNK) == 'новый'
+    assert (len(base), len(draft)) == (3 * CHUNK - 1, 3 * CHUNK - 1)
+    assert draft._chunks[2] is base._chunks[2]
+    assert list(draft) == [i for i in range(1, 3 * CHUNK + 1) if i != CHUNK]
+    assert draft.get_many([3 * CHUNK, CHUNK, 1, 10 * CHUNK]) == ['новый', None, '1', None]
+
+
+def test_record_map_drops_empty_chunks():
+    records = RecordMap([(1, 'a'), (CHUNK, 'b')])
+    draft = records.copy()
+    assert draft.pop(CHUNK) == 'b'
+    assert draft.pop(CHUNK, 'нет') == 'нет'
+    assert list(draft) == [1] and len(draft) == 1
+    assert list(records) == [1, CHUNK]
+
+
+def test_lazy_store_compacts_records_in_warm_up():
+    store = MemoryStore(seed(3 * CHUNK), 3 * CHUNK + 1, lazy=True)
+    before = view(store.snapshot())
+    store.update(5, {'full_name': 'Другой'})
+    store.update(5, {'full_name': 'Подозреваемый 5'})
+    store.warm_up()
+
+    snapshot = store.snapshot()
+    assert all(type(r) is Suspect for r in snapshot)
+    assert view(snapshot)[2:] == before[2:]
+    assert snapshot.encoded(1) == dumps(seed(1)[0])